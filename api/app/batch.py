@@ -0,0 +1,70 @@
+# api/app/batch.py
+from __future__ import annotations
+
+import os, json, asyncio
+from typing import AsyncIterator, Optional
+
+from .llm import analyze_with_llm
+from .scoring import prescore_many
+
+BATCH_MAX_ITEMS   = int(os.getenv("BATCH_MAX_ITEMS", "50"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))   # plafond serveur
+
+
+async def _analyze_item(sem: asyncio.Semaphore, index: int, rank: int, prescore: dict,
+                        resume: str, job: str, language: str, gender: str) -> dict:
+    item = {"index": index, "rank": rank, "prescore": prescore}
+    async with sem:
+        try:
+            result = await analyze_with_llm(resume, job, language, gender)
+        except Exception as e:
+            return {**item, "ok": False, "error": f"upstream: {e}"}
+    if result.get("ok") is False:
+        return {**item, "ok": False, "error": result.get("error", "unknown error")}
+    return {**item, "ok": True, "result": result}
+
+async def run_batch(
+    pairs: list[tuple[str, str]],
+    language: str = "fr",
+    gender: str = "auto",
+    concurrency: int = BATCH_CONCURRENCY,
+    top_k: Optional[int] = None,
+) -> AsyncIterator[dict]:
+    """
+    Pré-score local de toutes les paires (cv, offre), classement, puis analyse LLM
+    (même prompt, même cache) des `top_k` meilleures seulement (toutes si None),
+    au plus `concurrency` appels amont simultanés, les mieux classées d'abord.
+    Les éléments hors top_k sortent immédiatement ; les autres dans l'ordre de
+    complétion ; puis un récapitulatif. Un échec n'interrompt pas le lot.
+    """
+    # Jusqu'à BATCH_MAX_ITEMS textes à tokeniser : hors de l'event loop
+    scores = await asyncio.to_thread(prescore_many, pairs)
+    order = sorted(range(len(pairs)), key=lambda i: -scores[i]["score"])
+    rank = {i: r for r, i in enumerate(order, 1)}
+    selected = order if top_k is None else order[:max(0, top_k)]
+
+    ok = 0
+    for i in order[len(selected):]:
+        ok += 1
+        yield {"index": i, "rank": rank[i], "prescore": scores[i], "ok": True, "llm": False}
+
+    sem = asyncio.Semaphore(max(1, min(concurrency, BATCH_CONCURRENCY)))
+    # Créées dans l'ordre du classement : le sémaphore (FIFO) sert les meilleures d'abord
+    tasks = [
+        asyncio.create_task(_analyze_item(sem, i, rank[i], scores[i], *pairs[i], language, gender))
+        for i in selected
+    ]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            item = await fut
+            ok += item["ok"]
+            yield item
+        yield {"done": True, "total": len(pairs), "ok": ok, "failed": len(pairs) - ok, "llm_calls": len(tasks)}
+    finally:
+        # Client parti en cours de route : on n'appelle plus l'amont pour rien
+        for t in tasks:
+            t.cancel()
+
+async def ndjson(items: AsyncIterator[dict]) -> AsyncIterator[str]:
+    async for item in items:
+        yield json.dumps(item, ensure_ascii=False) + "\n"
@@ -0,0 +1,186 @@
+# api/app/cache.py
+from __future__ import annotations
+
+import os, time, json, hashlib, sqlite3, asyncio, threading, unicodedata, re
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+from .metrics import record_cache
+
+CACHE_TTL  = int(os.getenv("CACHE_TTL", "900"))
+CACHE_SIZE = int(os.getenv("CACHE_SIZE", "128"))
+CACHE_DB   = os.getenv("CACHE_DB", "")  # ex: /tmp/cvagent-cache.sqlite (partagé entre workers)
+CACHE_DB_MAX_ROWS = int(os.getenv("CACHE_DB_MAX_ROWS", "10000"))  # au-delà, les plus proches de l'expiration partent
+CACHE_DB_PURGE_INTERVAL = 60.0  # s, par worker
+
+_WS = re.compile(r"\s+")
+
+def normalize_text(s: str) -> str:
+    """Normalisation légère pour la clé : NFC + espaces compactés."""
+    return _WS.sub(" ", unicodedata.normalize("NFC", s or "")).strip()
+
+def make_key(*parts: Any) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(normalize_text(str(p)).encode("utf-8"))
+        h.update(b"\x1f")  # séparateur : ('ab','c') != ('a','bc')
+    return h.hexdigest()
+
+
+class _DiskTier:
+    """
+    Tier SQLite optionnel : survit aux redémarrages, partagé entre workers uvicorn.
+    Purge (expirés, puis excédent au-delà de `max_rows`) au plus une fois par
+    CACHE_DB_PURGE_INTERVAL, pas à chaque écriture.
+    """
+
+    def __init__(self, path: str, max_rows: int = CACHE_DB_MAX_ROWS):
+        self._lock = threading.Lock()
+        self.max_rows = max_rows
+        self._next_purge = 0.0
+        self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_expires ON results (expires)")
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM results WHERE key = ? AND expires > ?", (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: dict, ttl: float):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (key, value, expires) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now + ttl),
+            )
+            if now >= self._next_purge:
+                self._next_purge = now + CACHE_DB_PURGE_INTERVAL
+                self._purge(now)
+
+    def _purge(self, now: float):
+        self._db.execute("DELETE FROM results WHERE expires <= ?", (now,))
+        excess = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0] - self.max_rows
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY expires LIMIT ?)", (excess,)
+            )
+
+
+class _Flight:
+    """Calcul en cours pour une clé, et nombre de requêtes qui l'attendent."""
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class ResultCache:
+    """
+    Cache de résultats adressé par contenu :
+    - tier mémoire LRU + TTL (par worker)
+    - tier SQLite optionnel (CACHE_DB)
+    - single-flight : N requêtes identiques concurrentes => 1 seul calcul
+    """
+
+    def __init__(self, name: str, ttl: int = CACHE_TTL, size: int = CACHE_SIZE, db_path: str = CACHE_DB):
+        self.name = name
+        self.ttl = ttl
+        self.size = size
+        self._mem: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._inflight: dict[str, _Flight] = {}
+        self._disk = _DiskTier(db_path) if db_path else None
+
+    def get(self, key: str) -> Optional[dict]:
+        item = self._mem.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires <= time.monotonic():
+            del self._mem[key]
+            return None
+        self._mem.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: dict):
+        if self.size <= 0 or self.ttl <= 0:
+            return
+        self._mem[key] = (time.monotonic() + self.ttl, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.size:
+            self._mem.popitem(last=False)
+
+    async def aget(self, key: str) -> Optional[dict]:
+        """Lecture mémoire puis disque, sans single-flight (ex: réponses en streaming)."""
+        value = self.get(key)
+        if value is not None:
+            record_cache(self.name, "hit")
+            return value
+        if self._disk is not None:
+            value = await asyncio.to_thread(self._disk.get, key)
+            if value is not None:
+                record_cache(self.name, "disk_hit")
+                self.set(key, value)
+                return value
+        record_cache(self.name, "miss")
+        return None
+
+    async def aset(self, key: str, value: dict):
+        self.set(key, value)
+        if self._disk is not None:
+            await asyncio.to_thread(self._disk.set, key, value, self.ttl)
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[dict]],
+        cacheable: Callable[[dict], bool] = lambda v: True,
+    ) -> dict:
+        value = self.get(key)
+        if value is not None:
+            record_cache(self.name, "hit")
+            return value
+
+        flight = self._inflight.get(key)
+        if flight is not None:
+            record_cache(self.name, "coalesced")
+        else:
+            # Calcul détaché, partagé par tous les demandeurs : l'annulation de l'un
+            # (client parti) n'interrompt pas les autres
+            flight = self._inflight[key] = _Flight(asyncio.create_task(self._fill(key, compute, cacheable)))
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                # Plus personne n'attend : inutile de continuer (ex. appel LLM)
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key: str, flight: "_Flight"):
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+
+    async def _fill(self, key: str, compute: Callable[[], Awaitable[dict]], cacheable: Callable[[dict], bool]) -> dict:
+        if self._disk is not None:
+            value = await asyncio.to_thread(self._disk.get, key)
+            if value is not None:
+                record_cache(self.name, "disk_hit")
+                self.set(key, value)
+                return value
+        record_cache(self.name, "miss")
+        value = await compute()
+        if cacheable(value):
+            self.set(key, value)
+            if self._disk is not None:
+                await asyncio.to_thread(self._disk.set, key, value, self.ttl)
+        return value
@@ -0,0 +1,268 @@
+# api/app/compact.py
+"""
+Compaction du prompt avant l'appel LLM :
+normalisation (en-têtes de page dédoublonnés) -> découpage du CV en sections -> classement des morceaux
+par pertinence vs l'offre -> remplissage d'un budget de tokens (estimation locale).
+"""
+from __future__ import annotations
+
+import os, re, math, unicodedata
+from collections import Counter
+from typing import Optional
+
+from .scoring import tokenize
+
+PROMPT_RESUME_TOKENS = int(os.getenv("PROMPT_RESUME_TOKENS", "3000"))
+PROMPT_JOB_TOKENS    = int(os.getenv("PROMPT_JOB_TOKENS", "1500"))
+CHUNK_TOKENS         = 120
+_MIN_PIECE_TOKENS    = 16       # en dessous, un morceau tronqué n'apporte plus rien
+RAW_MAX_CHARS        = 100_000  # garde-fou CPU avant tout traitement
+
+try:
+    import tiktoken
+    _ENC = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _ENC = None
+
+_PIECE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+def estimate_tokens(text: str) -> int:
+    """tiktoken si installé, sinon heuristique BPE (~4 caractères par token pour les mots)."""
+    if not text:
+        return 0
+    if _ENC is not None:
+        return len(_ENC.encode(text, disallowed_special=()))
+    return sum(1 if not m.group()[0].isalnum() else math.ceil(len(m.group()) / 4) for m in _PIECE.finditer(text))
+
+
+# ---------- Normalisation ----------
+_CTRL = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f\u00ad\u200b-\u200f\ufeff]")
+_HYPHEN_BREAK = re.compile(r"(\w)-\n(\w)")
+_SPACES = re.compile(r"[ \t\u00a0]+")
+_BULLETS = re.compile(r"^[ \t]*[\u2022\u00b7\u25aa\u25cf\u25e6\u2023\u2219*\u2013\u2014-]+[ \t]*", re.M)
+_PAGE_NOISE = re.compile(r"^\s*(?:page\s*)?\d{1,3}\s*(?:/|sur|of)\s*\d{1,3}\s*$|^\s*-\s*\d{1,3}\s*-\s*$", re.I | re.M)
+
+_EDGE_LINES = 2  # lignes examinées en tête et en pied de chaque page
+
+def _clean_lines(text: str) -> list[str]:
+    text = unicodedata.normalize("NFKC", text)
+    text = _CTRL.sub("", text).replace("\r\n", "\n").replace("\r", "\n")
+    text = _HYPHEN_BREAK.sub(r"\1\2", text)
+    text = _PAGE_NOISE.sub("", text)
+    text = _BULLETS.sub("- ", text)
+    return [_SPACES.sub(" ", line).strip() for line in text.split("\n")]
+
+def _page_boilerplate(pages: list[list[str]]) -> set[str]:
+    """
+    Lignes répétées à la même place (tête ou pied) d'au moins deux pages : en-têtes / pieds
+    de page. Les puces ("- ...") sont du contenu, jamais du gabarit.
+    """
+    heads: Counter = Counter()
+    feet: Counter = Counter()
+    for lines in pages:
+        content = [line.casefold() for line in lines if line and not line.startswith("- ")]
+        heads.update(set(content[:_EDGE_LINES]))
+        feet.update(set(content[-_EDGE_LINES:]))
+    return {key for key, n in (heads + feet).items() if heads[key] >= 2 or feet[key] >= 2}
+
+def normalize(text: str, page_offsets: Optional[list[int]] = None) -> str:
+    """
+    Nettoie le bruit d'extraction PDF. Avec les débuts de page (`page_offsets`), les en-têtes
+    et pieds de page répétés ne sont gardés qu'une fois ; une ligne répétée ailleurs (même
+    compétence ou même date sous deux postes) est conservée. Seuls les doublons consécutifs
+    (artefact d'extraction) sont toujours retirés.
+    """
+    text = (text or "")[:RAW_MAX_CHARS]
+    bounds = [o for o in (page_offsets or [0]) if o < len(text)] or [0]
+    pages = [_clean_lines(text[a:b]) for a, b in zip(bounds, bounds[1:] + [len(text)])]
+    boilerplate = _page_boilerplate(pages) if len(pages) > 1 else set()
+
+    out, seen, blank, prev = [], set(), False, None
+    for line in (line for lines in pages for line in lines):
+        if not line:
+            if out and not blank:
+                out.append("")
+            blank, prev = True, None
+            continue
+        key = line.casefold()
+        if key == prev:
+            continue
+        prev = key
+        if key in boilerplate:
+            if key in seen:
+                continue
+            seen.add(key)
+        out.append(line)
+        blank = False
+    return "\n".join(out).strip()
+
+
+# ---------- Sections ----------
+_HEADINGS = re.compile(
+    r"^(?:"
+    r"profil|profile|résumé|summary|about|à propos|objectif|objective|"
+    r"exp[ée]riences?(?: professionnelles?)?|(?:professional |work )?experience|parcours|emplois?|employment|"
+    r"formations?|[ée]ducation|dipl[ôo]mes?|études|academic background|"
+    r"comp[ée]tences?(?: techniques| cl[ée]s)?|skills|technical skills|expertise|outils|tools|"
+    r"projets?|projects|certifications?|langues|languages|"
+    r"publications|b[ée]n[ée]volat|volunteering|centres? d'int[ée]r[êe]ts?|loisirs|interests|hobbies|"
+    r"r[ée]f[ée]rences|references|contact|informations? personnelles"
+    r")\s*:?$",
+    re.I,
+)
+
+def _is_heading(line: str) -> bool:
+    if len(line) > 60:
+        return False
+    if _HEADINGS.match(line):
+        return True
+    letters = [c for c in line if c.isalpha()]
+    return len(letters) >= 4 and all(c.isupper() for c in letters) and len(line.split()) <= 5
+
+def split_sections(text: str) -> list[tuple[str, str]]:
+    """[(titre, contenu)] ; le bloc avant le premier titre (identité, contact) a le titre ''."""
+    sections, title, buf = [], "", []
+    for line in text.split("\n"):
+        if _is_heading(line.strip()):
+            if buf or title:
+                sections.append((title, "\n".join(buf).strip()))
+            title, buf = line.strip().rstrip(":").strip(), []
+        else:
+            buf.append(line)
+    sections.append((title, "\n".join(buf).strip()))
+    return [(t, b) for t, b in sections if t or b]
+
+
+# ---------- Classement + budget ----------
+def _terms(text: str) -> Counter:
+    # Même tokenisation que le pré-score : accents, pluriels et alias de compétences
+    return Counter(tokenize(text))
+
+_SENTENCE = re.compile(r"(?<=[.!?;])\s+")
+
+def _split_line(line: str, limit: int = CHUNK_TOKENS) -> list[str]:
+    """
+    Ligne trop longue (CV collé ou extrait sur une seule ligne) : morceaux d'environ `limit`
+    tokens, coupés entre phrases, sinon entre mots.
+    """
+    pieces, cur, cur_tokens = [], [], 0
+    for sentence in _SENTENCE.split(line):
+        words = [sentence] if estimate_tokens(sentence) <= limit else sentence.split(" ")
+        for word in words:
+            t = estimate_tokens(word)
+            if cur and cur_tokens + t > limit:
+                pieces.append(" ".join(cur))
+                cur, cur_tokens = [], 0
+            cur.append(word)
+            cur_tokens += t
+    if cur:
+        pieces.append(" ".join(cur))
+    return pieces
+
+def _chunks(title: str, body: str) -> list[str]:
+    """
+    Un morceau par paragraphe (une expérience, un diplôme...) ; un paragraphe trop long
+    est redécoupé par lignes (puis phrases ou mots) en morceaux d'environ CHUNK_TOKENS.
+    """
+    chunks = []
+    for para in body.split("\n\n"):
+        para = para.strip()
+        if not para:
+            continue
+        if estimate_tokens(para) <= 2 * CHUNK_TOKENS:
+            chunks.append(para)
+            continue
+        cur, cur_tokens = [], 0
+        for line in para.split("\n"):
+            t = estimate_tokens(line)
+            if t > CHUNK_TOKENS:
+                if cur:
+                    chunks.append("\n".join(cur))
+                    cur, cur_tokens = [], 0
+                chunks.extend(_split_line(line))
+                continue
+            if cur and cur_tokens + t > CHUNK_TOKENS:
+                chunks.append("\n".join(cur))
+                cur, cur_tokens = [], 0
+            cur.append(line)
+            cur_tokens += t
+        if cur:
+            chunks.append("\n".join(cur))
+    if title:
+        chunks = [f"{title}\n{chunks[0]}" if chunks else title] + chunks[1:]
+    return chunks
+
+def compact_resume(resume: str, job: str, budget: int = PROMPT_RESUME_TOKENS) -> str:
+    """
+    Garde les morceaux les plus pertinents pour l'offre jusqu'au budget, dans l'ordre d'origine.
+    Le bloc d'en-tête (identité) est toujours gardé ; dans chaque section, les premiers
+    morceaux (expériences les plus récentes, CV antéchronologique) sont légèrement favorisés.
+    """
+    text = normalize(resume)
+    if estimate_tokens(text) <= budget:
+        return text
+
+    job_terms = _terms(job)
+    candidates = []  # (score, position, texte, tokens)
+    pos = 0
+    for s_index, (title, body) in enumerate(split_sections(text)):
+        for c_index, chunk in enumerate(_chunks(title, body)):
+            tokens = estimate_tokens(chunk)
+            terms = _terms(chunk)
+            overlap = sum(min(n, 3) for t, n in terms.items() if t in job_terms)
+            score = overlap / math.sqrt(max(tokens, 1)) + 1.0 / (1 + c_index)
+            if s_index == 0 and c_index == 0 and not title:
+                score = math.inf
+            candidates.append((score, pos, chunk, tokens))
+            pos += 1
+
+    kept, used = [], 0
+    for score, p, chunk, tokens in sorted(candidates, key=lambda c: (-c[0], c[1])):
+        if used + tokens > budget:
+            # Trop gros pour la place restante : on en garde le début plutôt que rien
+            if budget - used < _MIN_PIECE_TOKENS:
+                continue
+            chunk = truncate_tokens(chunk, budget - used)
+            tokens = estimate_tokens(chunk)
+            if not chunk or used + tokens > budget:
+                continue
+        kept.append((p, chunk))
+        used += tokens
+    return "\n\n".join(chunk for _, chunk in sorted(kept))
+
+def truncate_tokens(text: str, budget: int) -> str:
+    """Coupe un texte à ~budget tokens, sur une frontière de ligne, sinon de mot."""
+    if estimate_tokens(text) <= budget:
+        return text
+    out, used = [], 0
+    for line in text.split("\n"):
+        t = estimate_tokens(line) + 1
+        if used + t > budget:
+            # Ligne qui déborde (texte sur une seule ligne) : on la coupe entre deux mots
+            words, left = [], budget - used - 1
+            for word in line.split(" "):
+                left -= estimate_tokens(word)
+                if left < 0:
+                    break
+                words.append(word)
+            if words:
+                out.append(" ".join(words))
+            elif not out:
+                out.append(line[:max(budget, 0) * 3])  # un seul "mot" géant (base64...) : coupe brute
+            break
+        out.append(line)
+        used += t
+    return "\n".join(out)
+
+def compact_inputs(
+    resume: str, job: str,
+    resume_budget: Optional[int] = None, job_budget: Optional[int] = None,
+) -> tuple[str, str, dict]:
+    """Renvoie (cv compacté, offre compactée, stats de tokens avant/après)."""
+    resume_budget = PROMPT_RESUME_TOKENS if resume_budget is None else resume_budget
+    job_budget = PROMPT_JOB_TOKENS if job_budget is None else job_budget
+    before = estimate_tokens(resume or "") + estimate_tokens(job or "")
+    job_c = truncate_tokens(normalize(job), job_budget)
+    resume_c = compact_resume(resume, job_c, resume_budget)
+    after = estimate_tokens(resume_c) + estimate_tokens(job_c)
+    return resume_c, job_c, {"before": before, "after": after}
@@ -0,0 +1,95 @@
+# api/app/docstore.py
+"""
+Documents importés, adressés par le hash de leur contenu brut.
+
+Un upload renvoie `resume_id` ; les endpoints LLM l'acceptent à la place de `resume`.
+Le même fichier renvoyé n'est pas ré-analysé. Stockage : ResultCache (LRU + TTL
+en mémoire, single-flight). Le texte d'un CV est une donnée personnelle : pas d'écriture
+disque par défaut ; DOCS_DB active un tier SQLite partagé entre workers uvicorn.
+"""
+from __future__ import annotations
+
+import os, re, asyncio, hashlib
+from typing import Any, Awaitable, BinaryIO, Callable, Optional
+
+from .cache import ResultCache
+from .compact import normalize, split_sections, estimate_tokens
+
+DOCS_TTL       = int(os.getenv("DOCS_TTL", "86400"))
+DOCS_SIZE      = int(os.getenv("DOCS_SIZE", "256"))
+DOCS_DB        = os.getenv("DOCS_DB", "")  # ex: /tmp/cvagent-docs.sqlite (partagé entre workers) ; vide => mémoire
+DOCS_MAX_CHARS = 200_000
+
+# A incrémenter si l'extraction change : les anciens ids ne sont plus servis
+DOC_VERSION = "3"
+
+_ID = re.compile(r"^[0-9a-f]{64}$")
+
+_documents = ResultCache("documents", ttl=DOCS_TTL, size=DOCS_SIZE, db_path=DOCS_DB)
+
+
+def _hash_file(fileobj: BinaryIO) -> str:
+    h = hashlib.sha256(f"cvagent-doc-{DOC_VERSION}\x1f".encode())
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(1024 * 1024), b""):
+        h.update(block)
+    fileobj.seek(0)
+    return h.hexdigest()
+
+async def document_id(fileobj: BinaryIO) -> str:
+    """Hash SHA-256 du contenu brut, lu par blocs depuis le fichier spoolé de l'upload."""
+    return await asyncio.to_thread(_hash_file, fileobj)
+
+def build_document(doc_id: str, kind: str, text: str, **extra: Any) -> dict:
+    """
+    Texte extrait + artefacts précalculés (texte normalisé, titres de sections, tokens).
+    Seuls les titres des sections sont gardés : la compaction redécoupe le texte normalisé.
+    """
+    text = (text or "")[:DOCS_MAX_CHARS]
+    normalized = normalize(text, extra.get("page_offsets"))
+    return {
+        "id": doc_id, "kind": kind, "text": text, "normalized": normalized,
+        "sections": [title for title, _ in split_sections(normalized) if title],
+        "tokens": estimate_tokens(normalized),
+        **extra,
+    }
+
+def _complete(doc: dict) -> bool:
+    # Un PDF coupé par le budget de temps n'est pas gardé : le prochain essai peut aller au bout
+    return not doc.get("partial")
+
+async def get_or_parse(
+    fileobj: BinaryIO, kind: str, parse: Callable[[], Awaitable[dict]],
+) -> tuple[dict, bool]:
+    """
+    -> (document, cached). `parse()` renvoie {"text": ..., autres champs} et n'est appelé
+    que si ce contenu est inconnu ; les uploads identiques simultanés partagent le même calcul.
+    """
+    doc_id = await document_id(fileobj)
+    parsed = False
+
+    async def compute() -> dict:
+        nonlocal parsed
+        parsed = True
+        fields = await parse()
+        return await asyncio.to_thread(build_document, doc_id, kind, **fields)
+
+    doc = await _documents.get_or_compute(doc_id, compute, cacheable=_complete)
+    return doc, not parsed
+
+async def lookup(doc_id: str) -> Optional[dict]:
+    if not _ID.match(doc_id or ""):
+        return None
+    return await _documents.aget(doc_id)
+
+async def store(doc: dict):
+    if _complete(doc):
+        await _documents.aset(doc["id"], doc)
+
+def summary(doc: dict) -> dict:
+    """Champs renvoyés au client avec l'id (pas le texte normalisé)."""
+    return {
+        "resume_id": doc["id"],
+        "tokens": doc["tokens"],
+        "sections": doc["sections"],
+    }
@@ -1,21 +1,122 @@
 # api/app/extract.py
 from __future__ import annotations
 
-def sniff_and_extract(filename: str, data: bytes) -> tuple[str, str]:
+import os, zlib, zipfile
+from typing import BinaryIO
+
+try:
+    from lxml import etree as _etree
+    _LXML = True
+except Exception:
+    import xml.etree.ElementTree as _etree
+    _LXML = False
+
+_XML_ERROR = _etree.XMLSyntaxError if _LXML else _etree.ParseError
+# DOCX corrompu (zip tronqué, membre abîmé, XML invalide) : à convertir en 4xx par l'appelant
+DOCX_ERRORS = (zipfile.BadZipFile, KeyError, zlib.error, EOFError, _XML_ERROR)
+
+MAX_TEXT_CHARS   = int(os.getenv("EXTRACT_MAX_CHARS", "50000"))
+DOCX_MAX_XML_MB  = int(os.getenv("DOCX_MAX_XML_MB", "40"))  # garde-fou zip bomb
+
+SNIFF_BYTES = 8192
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_T, _W_P, _W_TAB, _W_BR, _W_CR = _W + "t", _W + "p", _W + "tab", _W + "br", _W + "cr"
+_W_PPR = _W + "pPr"  # propriétés du paragraphe : ses w:tab sont des taquets, pas du texte
+
+_TEXT_CONTROLS = {9, 10, 12, 13, 27, 8}
+
+
+def sniff_kind(head: bytes, filename: str = "") -> str:
     """
-    Extracteur minimal :
-    - Essaie de décoder comme texte brut (utf-8).
-    - Si échec -> renvoie ('bin', '') proprement, sans casser l'API.
-    Remplace-le plus tard par ton vrai extracteur PDF/DOCX si besoin.
+    Détecte le format sur les premiers octets (magic bytes), pas sur l'extension.
+    Renvoie 'pdf' | 'docx' | 'doc' | 'txt' | 'bin'.
     """
-    name = (filename or "").lower()
-    # Heuristique basique
-    for enc in ("utf-8", "latin-1"):
-        try:
-            text = data.decode(enc)
-            kind = "txt"
-            return (kind, text)
-        except Exception:
-            pass
-    # Rien de lisible
-    return ("bin", "")
+    if b"%PDF-" in head[:1024]:
+        return "pdf"
+    if head.startswith(b"PK\x03\x04"):
+        return "docx"  # confirmé à l'ouverture (word/document.xml)
+    if head.startswith(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"):
+        return "doc"   # Word 97-2003 (OLE) : non supporté
+    if head.startswith((b"\xff\xfe", b"\xfe\xff")):
+        return "txt"   # UTF-16 avec BOM
+    return "bin" if _looks_binary(head) else "txt"
+
+def _looks_binary(head: bytes) -> bool:
+    if not head:
+        return False
+    if b"\x00" in head:
+        return True
+    controls = sum(1 for b in head if b < 32 and b not in _TEXT_CONTROLS)
+    return controls / len(head) > 0.1
+
+def decode_text(data: bytes) -> str:
+    if data.startswith(b"\xef\xbb\xbf"):
+        return data[3:].decode("utf-8", errors="replace")
+    if data.startswith((b"\xff\xfe", b"\xfe\xff")):
+        return data.decode("utf-16", errors="replace")
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # Coupure au milieu d'un caractère multi-octets (lecture bornée)
+        if e.start >= len(data) - 3:
+            return data[:e.start].decode("utf-8")
+    return data.decode("cp1252", errors="replace")
+
+def extract_docx(fileobj: BinaryIO, max_chars: int = MAX_TEXT_CHARS) -> str:
+    """
+    Lecture en flux de word/document.xml directement dans le zip (iterparse),
+    sans DOM complet : la mémoire reste bornée quelle que soit la taille du document.
+    Lève une des DOCX_ERRORS si le contenu est corrompu.
+    """
+    with zipfile.ZipFile(fileobj) as zf:
+        info = zf.getinfo("word/document.xml")  # KeyError : zip, mais pas un DOCX
+        if info.file_size > DOCX_MAX_XML_MB * 1024 * 1024:
+            return ""
+        with zf.open(info) as xml:
+            if _LXML:
+                events = _etree.iterparse(
+                    xml, events=("start", "end"), tag=(_W_T, _W_P, _W_TAB, _W_BR, _W_CR, _W_PPR),
+                    resolve_entities=False, no_network=True, huge_tree=False,
+                )
+            else:
+                events = _etree.iterparse(xml, events=("start", "end"))
+
+            paragraphs, parts, total = [], [], 0
+            in_ppr = 0
+            for event, el in events:
+                tag = el.tag
+                if tag == _W_PPR:
+                    in_ppr += 1 if event == "start" else -1
+                elif event == "start" or in_ppr:
+                    continue
+                elif tag == _W_T:
+                    if el.text:
+                        parts.append(el.text)
+                elif tag == _W_TAB:
+                    parts.append("\t")
+                elif tag in (_W_BR, _W_CR):
+                    parts.append("\n")
+                elif tag == _W_P:
+                    line = "".join(parts)
+                    parts = []
+                    paragraphs.append(line)
+                    total += len(line) + 1
+                    el.clear()
+                    if _LXML:
+                        # Libère aussi les paragraphes déjà traités
+                        while el.getprevious() is not None:
+                            del el.getparent()[0]
+                    if total >= max_chars:
+                        break
+    return "\n".join(paragraphs)[:max_chars]
+
+def extract_file(fileobj: BinaryIO, kind: str, max_chars: int = MAX_TEXT_CHARS) -> str:
+    """Extraction bornée (DOCX, texte) depuis un fichier spoolé déjà typé par sniff_kind."""
+    fileobj.seek(0)
+    if kind == "docx":
+        return extract_docx(fileobj, max_chars)
+    if kind == "txt":
+        # 4 octets max par caractère : inutile de décoder au-delà
+        return decode_text(fileobj.read(max_chars * 4))[:max_chars]
+    return ""  # PDF : extraction par pages dans le pool de process (pdf.py)
@@ -0,0 +1,226 @@
+# api/app/jobs.py
+from __future__ import annotations
+
+import os, json, math, time, uuid, sqlite3, asyncio, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Optional
+
+from .metrics import JOBS_QUEUE_DEPTH, JOBS_TOTAL
+
+JOBS_WORKERS    = int(os.getenv("JOBS_WORKERS", "8"))
+JOBS_QUEUE_SIZE = int(os.getenv("JOBS_QUEUE_SIZE", "100"))
+JOBS_DB         = os.getenv("JOBS_DB", "/tmp/cvagent-jobs.sqlite")  # vide => mémoire uniquement
+JOBS_TTL        = int(os.getenv("JOBS_TTL", "86400"))               # rétention des résultats (s)
+JOBS_HEARTBEAT  = float(os.getenv("JOBS_HEARTBEAT", "10"))          # rafraîchissement des jobs en cours (s)
+
+TERMINAL = ("done", "failed")
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__("job queue full")
+        self.retry_after = retry_after
+
+
+class _JobStore:
+    """
+    Persistance SQLite : un redémarrage ne perd pas les résultats terminés. Base partagée
+    entre workers uvicorn : chaque ligne porte son propriétaire (id de démarrage du worker),
+    qui rafraîchit ses jobs en cours ; seuls les jobs sans battement sont déclarés interrompus.
+    """
+
+    def __init__(self, path: str, owner: str):
+        self.owner = owner
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL,"
+            " result TEXT, error TEXT, created REAL NOT NULL, updated REAL NOT NULL, owner TEXT)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        if "owner" not in columns:  # base créée par une version précédente
+            self._db.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+
+    def save(self, job: dict):
+        result = json.dumps(job["result"], ensure_ascii=False) if job.get("result") is not None else None
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO jobs (id, kind, status, result, error, created, updated, owner)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job["id"], job["kind"], job["status"], result, job.get("error"), job["created"], job["updated"], self.owner),
+            )
+
+    def load(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, kind, status, result, error, created, updated FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if not row:
+            return None
+        return {
+            "id": row[0], "kind": row[1], "status": row[2],
+            "result": json.loads(row[3]) if row[3] else None, "error": row[4],
+            "created": row[5], "updated": row[6],
+        }
+
+    def heartbeat(self, ttl: float, stale: float):
+        """
+        Rafraîchit les jobs en cours de ce worker, purge les vieux jobs et marque comme
+        interrompus ceux d'un autre worker sans battement depuis `stale` secondes (arrêté).
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET updated = ? WHERE owner = ? AND status IN ('queued', 'running')", (now, self.owner),
+            )
+            self._db.execute("DELETE FROM jobs WHERE updated < ?", (now - ttl,))
+            self._db.execute(
+                "UPDATE jobs SET status = 'failed', error = 'interrupted by restart', updated = ?"
+                " WHERE status IN ('queued', 'running') AND owner IS NOT ? AND updated < ?",
+                (now, self.owner, now - stale),
+            )
+
+
+class JobManager:
+    """
+    Mode job : POST renvoie un id tout de suite, un pool fixe de workers asyncio exécute
+    le travail. File bornée : si elle est pleine, submit() lève QueueFull (=> 429 + Retry-After)
+    au lieu d'empiler des threads.
+    """
+
+    def __init__(self, workers: int = JOBS_WORKERS, queue_size: int = JOBS_QUEUE_SIZE, db_path: str = JOBS_DB):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: list[asyncio.Task] = []
+        self._jobs: dict[str, dict] = {}                   # jobs en cours (et récents) de ce worker
+        self._runs: dict[str, Callable[[], Awaitable[Any]]] = {}
+        self._changed: dict[str, asyncio.Event] = {}
+        self._store = _JobStore(db_path, owner=f"{os.getpid()}-{uuid.uuid4().hex[:8]}") if db_path else None
+        # Un seul thread d'écriture : les sauvegardes d'un job restent dans l'ordre
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jobs-db") if db_path else None
+        self._avg_seconds = 5.0                            # moyenne glissante, pour Retry-After
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if self._store is not None:
+            await self._write(self._store.heartbeat, JOBS_TTL, 3 * JOBS_HEARTBEAT)
+            self._tasks.append(asyncio.create_task(self._heartbeat()))
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, kind: str, run: Callable[[], Awaitable[Any]]) -> dict:
+        """Met le job en file ; rend la main une fois la ligne écrite (lisible par tous les workers)."""
+        if self._queue is None:
+            raise RuntimeError("job manager not started")
+        if self._queue.full():
+            depth = self._queue.qsize()
+            raise QueueFull(retry_after=math.ceil(depth * self._avg_seconds / max(1, self.workers)))
+        now = time.time()
+        job = {"id": uuid.uuid4().hex, "kind": kind, "status": "queued",
+               "result": None, "error": None, "created": now, "updated": now}
+        self._jobs[job["id"]] = job
+        self._runs[job["id"]] = run
+        self._changed[job["id"]] = asyncio.Event()
+        self._queue.put_nowait(job["id"])
+        JOBS_QUEUE_DEPTH.inc()
+        JOBS_TOTAL.labels(kind=kind, status="queued").inc()
+        saved = self._persist(job)
+        if saved is not None:
+            await asyncio.wrap_future(saved)
+        return job
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return dict(job)
+        if self._store is not None:
+            return await asyncio.to_thread(self._store.load, job_id)
+        return None
+
+    async def wait_for_change(self, job_id: str, timeout: float, poll: float = 1.0):
+        """
+        Attend un changement d'état. Job d'un autre worker uvicorn (pas d'Event local) :
+        simple attente de `poll` secondes, l'appelant relit ensuite SQLite.
+        """
+        ev = self._changed.get(job_id)
+        if ev is None:
+            await asyncio.sleep(poll)
+            return
+        try:
+            await asyncio.wait_for(ev.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _persist(self, job: dict):
+        if self._store is not None:
+            return self._writer.submit(self._store.save, dict(job))
+        return None
+
+    async def _write(self, fn: Callable, *args):
+        await asyncio.wrap_future(self._writer.submit(fn, *args))
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(JOBS_HEARTBEAT)
+            try:
+                await self._write(self._store.heartbeat, JOBS_TTL, 3 * JOBS_HEARTBEAT)
+            except sqlite3.Error:
+                pass  # base verrouillée : prochain battement
+
+    def _update(self, job: dict, **changes):
+        job.update(changes, updated=time.time())
+        self._persist(job)
+        ev = self._changed.get(job["id"])
+        if ev is not None:
+            ev.set()
+            self._changed[job["id"]] = asyncio.Event() if job["status"] not in TERMINAL else ev
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            JOBS_QUEUE_DEPTH.dec()
+            job = self._jobs[job_id]
+            run = self._runs.pop(job_id)
+            self._update(job, status="running")
+            start = time.monotonic()
+            try:
+                result = await run()
+                self._update(job, status="done", result=result)
+            except asyncio.CancelledError:
+                self._update(job, status="failed", error="cancelled")
+                raise
+            except Exception as e:
+                detail = getattr(e, "detail", None) or str(e) or e.__class__.__name__
+                self._update(job, status="failed", error=str(detail))
+            finally:
+                JOBS_TOTAL.labels(kind=job["kind"], status=job["status"]).inc()
+                self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * (time.monotonic() - start)
+                self._queue.task_done()
+                asyncio.get_running_loop().call_later(JOBS_TTL if self._store is None else 60, self._forget, job_id)
+
+    def _forget(self, job_id: str):
+        # Les résultats restent lisibles depuis SQLite ; la mémoire ne garde que le récent
+        self._jobs.pop(job_id, None)
+        self._changed.pop(job_id, None)
+
+
+job_manager = JobManager()
+
+def public_view(job: dict) -> dict:
+    view = {k: job[k] for k in ("id", "kind", "status", "created", "updated")}
+    if job["status"] == "done":
+        view["result"] = job["result"]
+    elif job["status"] == "failed":
+        view["error"] = job["error"]
+    return view
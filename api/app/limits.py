@@ -1,24 +1,277 @@
-# api/app/limits.py
-import os
-from starlette.requests import Request
+import os, math, mmap, time, zlib, struct, threading
+from typing import Optional
+from starlette.exceptions import HTTPException
 from starlette.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
-# Limiteur en mémoire (simple). Pour de la prod à gros trafic, plug Redis Storage.
-limiter = Limiter(key_func=get_remote_address, default_limits=["200/minute"])
+try:
+    import fcntl
+except Exception:  # Windows : pas de verrou inter-process, repli mémoire locale
+    fcntl = None
+
+# ---------- Rate limit : token buckets partagés entre workers ----------
+# État dans un fichier mmap (une table de slots à adressage ouvert), verrouillé par flock :
+# les limites sont exactes pour tous les workers uvicorn d'une même machine, sans Redis.
+RATE_LIMIT_FILE  = os.getenv("RATE_LIMIT_FILE", "/tmp/cvagent-ratelimit.bin")  # vide => mémoire du worker
+RATE_LIMIT_SLOTS = int(os.getenv("RATE_LIMIT_SLOTS", "8192"))
+RATE_LIMIT_DEFAULT = os.getenv("RATE_LIMIT_DEFAULT", "200/minute")
+# Multiplie toutes les limites (ex. 1000 pour un test de charge depuis une seule IP)
+RATE_LIMIT_SCALE = float(os.getenv("RATE_LIMIT_SCALE", "1"))
+
+# route -> (limite par client, limite globale tous clients confondus)
+ROUTE_LIMITS = {
+    "/analyze-text":        ("20/minute", "600/minute"),
+    "/linkedin/optimize":   ("30/minute", "600/minute"),
+    "/ingest/pdf":          ("30/minute", "300/minute"),
+    "/analyze-batch":       ("5/minute", "60/minute"),    # + chaque appel LLM débité sur LLM_BUDGET_ROUTE
+}
+# Budget d'appels LLM par client, partagé par /analyze-text, sa version SSE et les éléments de /analyze-batch
+LLM_BUDGET_ROUTE = "/analyze-text"
+# Routes débitées sur le bucket d'une autre
+ROUTE_ALIASES = {"/analyze-text/stream": LLM_BUDGET_ROUTE}
+EXEMPT = {"/", "/ping", "/ready", "/metrics"}
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+_SLOT = struct.Struct("<Qdd")  # clé, jetons, dernier remplissage (epoch)
+_PROBES = 8
+
+def parse_rate(spec: str) -> tuple[float, float]:
+    """'20/minute' -> (jetons par seconde, capacité du bucket)."""
+    count, _, period = spec.partition("/")
+    n = float(count) * RATE_LIMIT_SCALE
+    return n / _PERIODS[period.strip().rstrip("s")], n
+
+
+class _Policy:
+    __slots__ = ("pid", "rate", "burst", "global_key", "global_slot", "global_rate", "global_burst")
+
+    def __init__(self, pid: int, per_client: str, global_limit: Optional[str]):
+        self.pid = pid
+        self.rate, self.burst = parse_rate(per_client)
+        if global_limit:
+            self.global_rate, self.global_burst = parse_rate(global_limit)
+            self.global_key = (1 << 63) | (pid << 40)  # bit 0 à 0 : jamais une clé client
+            self.global_slot = pid * _SLOT.size       # slot réservé, hors table de hachage
+        else:
+            self.global_rate = self.global_burst = 0.0
+            self.global_key = self.global_slot = 0
+
+    def client_key(self, client: str) -> int:
+        # Hash stable entre process (hash() de str est randomisé par process)
+        return (1 << 63) | (self.pid << 40) | (zlib.crc32(client.encode()) << 1) | 1
+
+
+class _MemoryStore:
+    """Slots dans un bytearray local : même algorithme, portée d'un seul worker."""
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        self.buf = bytearray(slots * _SLOT.size)
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self._lock.acquire()
+        return self.buf
+
+    def __exit__(self, *exc):
+        self._lock.release()
+
+
+class _MmapStore:
+    def __init__(self, path: str, slots: int):
+        self.slots = slots
+        size = slots * _SLOT.size
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self.fd).st_size != size:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(self.fd).st_size != size:
+                    os.ftruncate(self.fd, size)
+            finally:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.buf = mmap.mmap(self.fd, size)
+        self._lock = threading.Lock()  # flock n'exclut pas les threads d'un même process
+
+    def __enter__(self):
+        self._lock.acquire()
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self.buf
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self._lock.release()
+
+
+def _find_slot(buf, first: int, slots: int, key: int) -> tuple[int, bool]:
+    """
+    Renvoie (offset, existant) dans la table [first, slots). Sonde linéaire ; sinon évince
+    le slot le plus ancien. Les slots [0, first) sont réservés aux buckets globaux.
+    """
+    size = _SLOT.size
+    table = slots - first
+    start = key % table
+    victim, victim_ts = -1, math.inf
+    for p in range(_PROBES):
+        off = (first + (start + p) % table) * size
+        k, _, ts = _SLOT.unpack_from(buf, off)
+        if k == key:
+            return off, True
+        if k == 0:
+            return off, False
+        if ts < victim_ts:
+            victim, victim_ts = off, ts
+    return victim, False
+
+
+class RateLimiter:
+    """
+    Token buckets par (route, client) et par route (global), table de politiques précompilée.
+    check() -> 0.0 si accepté, sinon le délai en secondes avant le prochain jeton.
+    """
+
+    def __init__(self, path: str = RATE_LIMIT_FILE, slots: int = RATE_LIMIT_SLOTS):
+        if path and fcntl is not None:
+            self.store = _MmapStore(path, slots)
+        else:
+            self.store = _MemoryStore(slots)
+        self.policies: dict[str, _Policy] = {}
+        for pid, (route, (per_client, global_limit)) in enumerate(ROUTE_LIMITS.items(), start=1):
+            self.policies[route] = _Policy(pid, per_client, global_limit)
+        self.default = _Policy(0, RATE_LIMIT_DEFAULT, None)
+        # Slots 0..len(ROUTE_LIMITS) : buckets globaux, jamais évincés par les clés client
+        self.reserved = len(ROUTE_LIMITS) + 1
+        if self.store.slots <= self.reserved + _PROBES:
+            raise ValueError(f"RATE_LIMIT_SLOTS too small ({self.store.slots})")
+
+    def _policy(self, route: str) -> _Policy:
+        return self.policies.get(ROUTE_ALIASES.get(route, route), self.default)
+
+    def burst(self, route: str) -> float:
+        """Capacité du bucket par client de la route (coût maximal d'un seul check)."""
+        return self._policy(route).burst
+
+    def _buckets(self, buf, policy: _Policy, c_key: int, now: float):
+        """(offset client, jetons client, offset global, jetons global) ; global : inf si sans limite."""
+        c_off, found = _find_slot(buf, self.reserved, self.store.slots, c_key)
+        c_tokens = self._load(buf, c_off, found, c_key, policy.rate, policy.burst, now)
+        if not policy.global_key:
+            return c_off, c_tokens, -1, math.inf
+        g_off = policy.global_slot
+        found = _SLOT.unpack_from(buf, g_off)[0] == policy.global_key
+        g_tokens = self._load(buf, g_off, found, policy.global_key, policy.global_rate, policy.global_burst, now)
+        return c_off, c_tokens, g_off, g_tokens
+
+    def available(self, route: str, client: str) -> float:
+        """Jetons utilisables tout de suite par ce client sur la route (sans rien débiter)."""
+        if route in EXEMPT:
+            return math.inf
+        policy = self._policy(route)
+        with self.store as buf:
+            _, c_tokens, _, g_tokens = self._buckets(buf, policy, policy.client_key(client), time.time())
+        return min(c_tokens, g_tokens)
+
+    def check(self, route: str, client: str, cost: float = 1.0) -> float:
+        """Débite `cost` jetons des buckets de la route (tout ou rien)."""
+        if route in EXEMPT:
+            return 0.0
+        policy = self._policy(route)
+        now = time.time()
+        c_key = policy.client_key(client)
+        with self.store as buf:
+            c_off, c_tokens, g_off, g_tokens = self._buckets(buf, policy, c_key, now)
+            wait = 0.0 if c_tokens >= cost else (cost - c_tokens) / policy.rate
+            if g_tokens < cost:
+                wait = max(wait, (cost - g_tokens) / policy.global_rate)
+            if wait:
+                return wait
+            # Les deux buckets ont assez de jetons : on consomme atomiquement
+            _SLOT.pack_into(buf, c_off, c_key, c_tokens - cost, now)
+            if policy.global_key:
+                _SLOT.pack_into(buf, g_off, policy.global_key, g_tokens - cost, now)
+        return 0.0
+
+    @staticmethod
+    def _load(buf, off: int, found: bool, key: int, rate: float, burst: float, now: float) -> float:
+        """Jetons disponibles dans le bucket du slot `off` (créé plein s'il n'existe pas)."""
+        if not found:
+            # Réserve le slot (bucket plein) pour qu'une 2e clé ne le réutilise pas
+            _SLOT.pack_into(buf, off, key, burst, now)
+            return burst
+        _, tokens, ts = _SLOT.unpack_from(buf, off)
+        return min(burst, tokens + max(0.0, now - ts) * rate)
+
+
+rate_limiter = RateLimiter()
+
+def too_many_requests(retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        {"detail": "Rate limit exceeded"},
+        status_code=429,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+class RateLimitMiddleware:
+    """ASGI pur : un check() par requête HTTP, 429 + Retry-After si le bucket est vide."""
+
+    def __init__(self, app: ASGIApp, limiter: RateLimiter = rate_limiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http":
+            client = scope.get("client")
+            retry_after = self.limiter.check(scope["path"], client[0] if client else "127.0.0.1")
+            if retry_after:
+                return await too_many_requests(retry_after)(scope, receive, send)
+        await self.app(scope, receive, send)
 
 # Limite de taille upload (fail fast)
-class MaxBodySizeMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app):
-        super().__init__(app)
+class MaxBodySizeMiddleware:
+    """
+    ASGI pur. Content-Length connu -> refus immédiat ; sinon (chunked) on compte les octets
+    au fil de receive() et on interrompt la lecture dès que la limite est dépassée.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
         self.max_mb = int(os.getenv("MAX_UPLOAD_MB", "8"))
         self.max_bytes = self.max_mb * 1024 * 1024
 
-    async def dispatch(self, request: Request, call_next):
-        # Content-Length connu → vérification immédiate
-        cl = request.headers.get("content-length")
-        if cl and cl.isdigit() and int(cl) > self.max_bytes:
-            return JSONResponse({"detail": f"Payload too large (> {self.max_mb} MB)"}, status_code=413)
-        return await call_next(request)
+    def _too_large(self) -> JSONResponse:
+        return JSONResponse({"detail": f"Payload too large (> {self.max_mb} MB)"}, status_code=413)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                if value.isdigit() and int(value) > self.max_bytes:
+                    return await self._too_large()(scope, receive, send)
+                break
+
+        received = 0
+        started = False
+
+        async def counting_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Remonte jusqu'au handler d'exceptions (=> 413 JSON) sans lire la suite
+                    raise HTTPException(status_code=413, detail=f"Payload too large (> {self.max_mb} MB)")
+            return message
+
+        async def tracking_send(message: Message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, tracking_send)
+        except HTTPException as e:
+            if e.status_code != 413 or started:
+                raise
+            await self._too_large()(scope, receive, send)
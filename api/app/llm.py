@@ -1,42 +1,34 @@
-# api/app/llm.py
-import os, time, json
-import requests
-
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GROQ_MODEL   = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
-
-API_URL = "https://api.groq.com/openai/v1/chat/completions"
-TIMEOUT = (5, 30)  # (connect, read) secondes
-RETRIES = 2
-
-def _post_with_retry(payload: dict):
-    last_err = None
-    for i in range(RETRIES + 1):
-        try:
-            r = requests.post(API_URL, headers={
-                "Authorization": f"Bearer {GROQ_API_KEY}",
-                "Content-Type": "application/json",
-            }, json=payload, timeout=TIMEOUT)
-            if r.status_code >= 500:
-                last_err = RuntimeError(f"upstream {r.status_code}")
-                time.sleep(0.7 * (i + 1))
-                continue
-            r.raise_for_status()
-            return r.json()
-        except Exception as e:
-            last_err = e
-            time.sleep(0.5 * (i + 1))
-    raise last_err
-
-def analyze_with_llm(resume: str, job: str, language="fr", gender="auto"):
-    if not GROQ_API_KEY:
-        return {"ok": False, "error": "GROQ_API_KEY missing"}
-
-    # Coupe les inputs (défense contre payloads énormes)
-    resume = (resume or "")[:20000]
-    job    = (job or "")[:8000]
-
-    prompt = f"""
+import os, json, asyncio
+from contextlib import aclosing
+
+from .cache import ResultCache, make_key
+from .compact import compact_inputs, PROMPT_RESUME_TOKENS, PROMPT_JOB_TOKENS
+from .metrics import PROMPT_TOKENS_ESTIMATED
+# Transport : backends, disjoncteur, budget, hedge, concurrence adaptative (voir upstream.py)
+from .upstream import upstream, UpstreamUnavailable
+
+GROQ_MODEL = upstream.primary.model if upstream.primary else os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
+
+# A incrémenter à chaque modification du prompt (invalide le cache)
+PROMPT_VERSION = "2"
+
+LLM_WARMUP = os.getenv("LLM_WARMUP", "0") in ("1", "true", "yes")  # ouvre la connexion au démarrage
+
+_analysis_cache = ResultCache("analysis")
+
+def get_client():
+    """Client httpx du backend principal (construit au démarrage, voir registry/lifespan)."""
+    return upstream.primary.client if upstream.primary else None
+
+async def aclose_client():
+    await upstream.aclose()
+
+async def warm_up() -> str:
+    """Ouvre la connexion (DNS + TLS + HTTP/2) avant la première requête, sans consommer de tokens."""
+    return await upstream.warm_up()
+
+def _build_prompt(resume: str, job: str, language: str, gender: str) -> str:
+    return f"""
 Tu es un expert RH. Analyse le CV vs l'offre ci-dessous.
 Réponds en JSON *valide* avec clés: "score", "forces", "manques", "reco", "mots_cles".
 Langue: {language}, Genre: {gender}
@@ -48,18 +40,168 @@ Langue: {language}, Genre: {gender}
 {job}
     """.strip()
 
+def _build_payload(prompt: str, stream: bool = False) -> dict:
+    # "model" est fixé par le backend qui sert la requête (basculement possible)
     payload = {
-        "model": GROQ_MODEL,
         "temperature": 0.2,
         "messages": [{"role": "user", "content": prompt}],
     }
+    if stream:
+        payload["stream"] = True
+    return payload
 
-    data = _post_with_retry(payload)
-    content = data["choices"][0]["message"]["content"]
+def _prepare(resume: str, job: str, language: str, gender: str):
+    # Compaction au budget de tokens (au lieu de couper à 20000/8000 caractères)
+    resume, job, tokens = compact_inputs(resume or "", job or "")
+    PROMPT_TOKENS_ESTIMATED.labels(stage="raw").inc(tokens["before"])
+    PROMPT_TOKENS_ESTIMATED.labels(stage="compacted").inc(tokens["after"])
+    key = make_key(resume, job, language, gender, GROQ_MODEL, PROMPT_VERSION,
+                   PROMPT_RESUME_TOKENS, PROMPT_JOB_TOKENS)
+    return resume, job, key, tokens
 
+def _finalize(content: str, model: str = GROQ_MODEL) -> dict:
     # Essaye de parser en JSON. Si c’est du texte, encapsule proprement.
     try:
         parsed = json.loads(content)
-        return {"ok": True, "model": GROQ_MODEL, **parsed}
+        return {"ok": True, "model": model, **parsed}
     except Exception:
-        return {"ok": True, "model": GROQ_MODEL, "result_raw": content}
+        return {"ok": True, "model": model, "result_raw": content}
+
+def _cacheable(result: dict) -> bool:
+    # La clé porte le modèle principal : une réponse servie par un backend de secours
+    # (autre modèle) n'est pas mise en cache sous cette clé
+    return result.get("ok") is True and "result_raw" not in result and result.get("model") == GROQ_MODEL
+
+async def analyze_with_llm(resume: str, job: str, language="fr", gender="auto"):
+    missing = upstream.missing_config()
+    if missing:
+        return {"ok": False, "error": missing}
+
+    # Compaction (tokenisation, classement) : CPU, hors de l'event loop
+    resume, job, key, tokens = await asyncio.to_thread(_prepare, resume, job, language, gender)
+    result = await _analysis_cache.get_or_compute(
+        key,
+        lambda: _analyze_uncached(resume, job, language, gender),
+        cacheable=_cacheable,
+    )
+    return {**result, "prompt_tokens": tokens}  # copie : l'objet en cache est partagé
+
+async def _analyze_uncached(resume: str, job: str, language: str, gender: str):
+    payload = _build_payload(_build_prompt(resume, job, language, gender))
+    data, backend = await upstream.complete(payload)
+    return _finalize(data["choices"][0]["message"]["content"], backend.model)
+
+# ---------- Streaming ----------
+class JsonFieldStream:
+    """
+    Parseur JSON incrémental, limité aux clés de premier niveau d'un objet.
+    feed() renvoie les paires (clé, valeur) dès que la valeur est complète.
+    Tolère du texte avant l'objet (ex: bloc ```json).
+    """
+
+    def __init__(self):
+        self.buf = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_str = False
+        self.esc = False
+        self.str_start = -1
+        self.key = None
+        self.value_start = -1
+        self.done = False
+
+    def feed(self, chunk: str) -> list[tuple[str, object]]:
+        out = []
+        self.buf += chunk
+        buf = self.buf
+        i = self.pos
+        n = len(buf)
+        while i < n and not self.done:
+            c = buf[i]
+            if self.in_str:
+                if self.esc:
+                    self.esc = False
+                elif c == "\\":
+                    self.esc = True
+                elif c == '"':
+                    self.in_str = False
+                    if self.depth == 1 and self.value_start < 0:
+                        self.key = json.loads(buf[self.str_start:i + 1])
+            elif self.depth == 0:
+                if c == "{":
+                    self.depth = 1
+            elif c == '"':
+                self.in_str = True
+                self.str_start = i
+            elif c == ":" and self.depth == 1 and self.value_start < 0 and self.key is not None:
+                self.value_start = i + 1
+            elif c in "{[":
+                self.depth += 1
+            elif c in "}]" or (c == "," and self.depth == 1):
+                if self.depth == 1 and self.value_start >= 0:
+                    try:
+                        out.append((self.key, json.loads(buf[self.value_start:i])))
+                    except ValueError:
+                        pass
+                    self.key, self.value_start = None, -1
+                if c != ",":
+                    self.depth -= 1
+                    if self.depth == 0:
+                        self.done = True
+            i += 1
+        self.pos = i
+        return out
+
+
+async def stream_analyze_with_llm(resume: str, job: str, language="fr", gender="auto"):
+    """
+    Variante streaming de analyze_with_llm. Produit des tuples (event, data) :
+    - ("token", {"delta": ...}) pour chaque fragment reçu de l'amont
+    - ("field", {"key": ..., "value": ...}) dès qu'une clé JSON est complète
+    - ("done", {...}) avec l'objet final (même forme que analyze_with_llm)
+    - ("error", {"error": ...}) en cas d'échec
+    """
+    missing = upstream.missing_config()
+    if missing:
+        yield "error", {"ok": False, "error": missing}
+        return
+
+    # Compaction (tokenisation, classement) : CPU, hors de l'event loop
+    resume, job, key, tokens = await asyncio.to_thread(_prepare, resume, job, language, gender)
+    cached = await _analysis_cache.aget(key)
+    if cached is not None:
+        for k, v in cached.items():
+            if k not in ("ok", "model"):
+                yield "field", {"key": k, "value": v}
+        yield "done", {**cached, "cached": True, "prompt_tokens": tokens}
+        return
+
+    payload = _build_payload(_build_prompt(resume, job, language, gender), stream=True)
+    parser = JsonFieldStream()
+    parts, fields = [], {}
+    model = GROQ_MODEL
+    try:
+        # aclosing : client parti => la requête amont est fermée tout de suite
+        async with aclosing(upstream.stream(payload)) as deltas:
+            async for delta, backend in deltas:
+                model = backend.model
+                parts.append(delta)
+                yield "token", {"delta": delta}
+                for k, v in parser.feed(delta):
+                    fields[k] = v
+                    yield "field", {"key": k, "value": v}
+    except UpstreamUnavailable as e:
+        yield "error", {"ok": False, "error": f"upstream: {e}", "retry_after": e.retry_after}
+        return
+    except Exception as e:
+        yield "error", {"ok": False, "error": f"upstream: {e}"}
+        return
+
+    # L'objet assemblé au fil de l'eau tolère le texte autour du JSON (```json ...)
+    if parser.done and fields:
+        result = {"ok": True, "model": model, **fields}
+    else:
+        result = _finalize("".join(parts), model)
+    if _cacheable(result):
+        await _analysis_cache.aset(key, result)
+    yield "done", {**result, "prompt_tokens": tokens}
@@ -1,48 +1,100 @@
 # api/app/main.py
-import os, base64
-from io import BytesIO
-from typing import Dict, Any
+import os, json, time, base64, asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional
+
+from dotenv import load_dotenv
+
+_IMPORT_START = time.perf_counter()  # début du démarrage : imports du package compris
+
+# Avant les imports du package : les modules lisent leur config (os.getenv) à l'import
+load_dotenv()
 
 from fastapi import FastAPI, UploadFile, File, HTTPException, Body, Request
 from fastapi.responses import StreamingResponse, Response, JSONResponse, PlainTextResponse
 from fastapi.exceptions import RequestValidationError
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from dotenv import load_dotenv
 
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import CONTENT_TYPE_LATEST
+from . import metrics as metrics_mod
+from .metrics import MetricsMiddleware
 from .security import make_middlewares
-from .limits import limiter, MaxBodySizeMiddleware
+from .limits import RateLimitMiddleware, MaxBodySizeMiddleware, too_many_requests, rate_limiter, LLM_BUDGET_ROUTE
+from .upstream import UpstreamError, UpstreamUnavailable
+# --- Modules optionnels (extract, llm, interview, exporter...) : résolus au démarrage
+from .registry import registry
 
-# --- Optionnel: extraction avancée si dispo
-try:
-    from .extract import sniff_and_extract
-except Exception:
-    sniff_and_extract = None
+# --- PDF : extraction hors event loop (pool de process)
+from . import pdf as pdf_extract
+# --- Documents importés, référencés par id (hash du contenu)
+from . import docstore
+# --- Mode job (file bornée + workers fixes)
+from .jobs import job_manager, public_view, QueueFull, TERMINAL
 
-# --- PDF simple (fallback)
-try:
-    from pypdf import PdfReader
-except Exception:
-    from PyPDF2 import PdfReader
+# ---------- Cycle de vie ----------
+_started: Optional[float] = None  # durée du démarrage (s) une fois prêt
 
-load_dotenv()
+async def _warm_up() -> dict:
+    """Pré-construit ce que la première requête paierait : client HTTP, pool PDF, connexion LLM."""
+    steps = {"pdf_pool": pdf_extract.warm_pool()}
+    llm = registry.get("llm")
+    if llm is not None:
+        llm.get_client()
+        if llm.LLM_WARMUP:
+            steps["llm"] = llm.warm_up()
+    results = await asyncio.gather(*steps.values(), return_exceptions=True)
+    return {
+        name: (f"error: {r.__class__.__name__}" if isinstance(r, Exception) else (r if isinstance(r, str) else "ok"))
+        for name, r in zip(steps, results)
+    }
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _started
+    start = _IMPORT_START
+    for name, cap in registry.load().items():
+        metrics_mod.CAPABILITY_UP.labels(capability=name).set(1 if cap.module is not None else 0)
+    imported = time.perf_counter()
+    registry.warmup = await _warm_up()
+    await job_manager.start()
+    done = time.perf_counter()
+    metrics_mod.STARTUP_SECONDS.labels(phase="imports").set(imported - start)
+    metrics_mod.STARTUP_SECONDS.labels(phase="warmup").set(done - imported)
+    metrics_mod.STARTUP_SECONDS.labels(phase="total").set(done - start)
+    _started = done - start
+    monitors = [asyncio.create_task(metrics_mod.sample_runtime())]
+    if metrics_mod.LOOP_LAG_INTERVAL > 0:
+        monitors.append(asyncio.create_task(metrics_mod.monitor_loop_lag()))
+    try:
+        yield
+    finally:
+        _started = None
+        for task in monitors:
+            task.cancel()
+        await job_manager.stop()
+        llm = registry.get("llm")
+        if llm is not None:
+            # Ferme proprement le pool de connexions vers le LLM
+            await llm.aclose_client()
+        pdf_extract.shutdown_pool()
+        metrics_mod.mark_process_dead()
+
+def _feature(name: str, detail: str):
+    """Module d'une capacité chargée au démarrage, sinon 501."""
+    module = registry.get(name)
+    if module is None:
+        raise HTTPException(status_code=501, detail=detail)
+    return module
 
 # ---------- App + Middlewares ----------
-app = FastAPI(title="CV Agent API", middleware=make_middlewares())
+app = FastAPI(title="CV Agent API", middleware=make_middlewares(), lifespan=lifespan)
+# Tous les middlewares sont en ASGI pur (pas de BaseHTTPMiddleware) : ils ne bufferisent
+# pas les StreamingResponse. add_middleware empile vers l'extérieur :
+# metrics -> rate-limit -> taille du corps -> make_middlewares() -> routes
 app.add_middleware(MaxBodySizeMiddleware)
-
-# SlowAPI (rate-limit)
-@app.middleware("http")
-async def _rate_limit_mw(request: Request, call_next):
-    route = request.url.path
-    # limites un peu plus strictes sur endpoints chers
-    special = {"/analyze-text": "20/minute", "/linkedin/optimize": "30/minute", "/ingest/pdf": "30/minute"}
-    limit = special.get(route)
-    if limit:
-        with limiter.limit(limit)(lambda r: None)(request):
-            return await call_next(request)
-    else:
-        return await call_next(request)
+# Rate-limit : token buckets partagés entre workers (voir limits.py)
+app.add_middleware(RateLimitMiddleware)
 
 # ---------- Global error handlers ----------
 @app.exception_handler(RequestValidationError)
@@ -53,21 +105,25 @@ async def validation_handler(request: Request, exc: RequestValidationError):
 async def http_exc_handler(request: Request, exc: HTTPException):
     return JSONResponse({"detail": exc.detail}, status_code=exc.status_code)
 
-# ---------- Prometheus ----------
-REQUEST_COUNT = Counter("cvagent_requests_total", "Total API requests", ["route", "method", "status"])
-REQUEST_LATENCY = Histogram("cvagent_request_latency_seconds", "Latency", ["route"])
+@app.exception_handler(UpstreamUnavailable)
+async def upstream_unavailable_handler(request: Request, exc: UpstreamUnavailable):
+    # Disjoncteur ouvert, saturation ou budget épuisé : le client peut réessayer plus tard
+    return JSONResponse(
+        {"detail": f"LLM indisponible: {exc}"}, status_code=503,
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))},
+    )
 
-@app.middleware("http")
-async def metrics_mw(request: Request, call_next):
-    route = request.url.path
-    with REQUEST_LATENCY.labels(route=route).time():
-        resp = await call_next(request)
-    REQUEST_COUNT.labels(route=route, method=request.method, status=resp.status_code).inc()
-    return resp
+@app.exception_handler(UpstreamError)
+async def upstream_error_handler(request: Request, exc: UpstreamError):
+    return JSONResponse({"detail": f"LLM amont en échec: {exc}"}, status_code=502)
+
+# ---------- Prometheus ----------
+app.add_middleware(MetricsMiddleware, routes=app.router.routes)
 
 @app.get("/metrics")
-def metrics():
-    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+async def metrics():
+    # async : échantillonne le threadpool depuis l'event loop
+    return Response(metrics_mod.render_latest(), media_type=CONTENT_TYPE_LATEST)
 
 # ---------- Health ----------
 @app.get("/")
@@ -78,84 +134,341 @@ def root():
 def ping():
     return {"pong": True}
 
+@app.get("/ready")
+def ready():
+    """Prêt une fois le démarrage terminé ; détaille les capacités chargées et le warm-up."""
+    body = {
+        "ready": _started is not None,
+        "startup_seconds": round(_started, 3) if _started is not None else None,
+        "capabilities": registry.status(),
+        "warmup": registry.warmup,
+    }
+    return JSONResponse(body, status_code=200 if _started is not None else 503)
+
 # ---------- Upload / parsing (extract.py si dispo) ----------
 @app.post("/resume/upload")
 async def upload_resume(file: UploadFile = File(...)):
-    if sniff_and_extract is None:
-        raise HTTPException(status_code=501, detail="Extraction non disponible (extract.py manquant).")
-    data = await file.read()
-    kind, text = sniff_and_extract(file.filename, data)
+    extract = _feature("extract", "Extraction non disponible (extract.py manquant).")
+    # Détection sur les magic bytes, puis une seule lecture/analyse du fichier spoolé
+    head = await file.read(extract.SNIFF_BYTES)
+    await file.seek(0)
+    kind = extract.sniff_kind(head, file.filename)
+    if kind == "doc":
+        raise HTTPException(status_code=415, detail="Format .doc non supporté : exporte en DOCX ou PDF.")
+    if kind == "bin":
+        raise HTTPException(status_code=415, detail="Format non reconnu (PDF, DOCX ou texte attendu).")
+
+    async def parse() -> dict:
+        if kind == "pdf":
+            return await _parse_pdf(file)
+        try:
+            return {"text": await run_in_threadpool(extract.extract_file, file.file, kind)}
+        except extract.DOCX_ERRORS:
+            raise HTTPException(status_code=400, detail="Document illisible (DOCX corrompu ?)")
+
+    # Fichier déjà vu (même contenu) : pas de nouvelle extraction
+    doc, cached = await docstore.get_or_parse(file.file, kind, parse)
+    text = doc["text"]
     if not text or len(text.strip()) < 20:
         raise HTTPException(status_code=400, detail="Texte non détecté (PDF scanné ?)")
-    return {"kind": kind, "text": text[:50000]}
+    return {"kind": doc["kind"], "text": text[:50000], **docstore.summary(doc), "cached": cached}
+
+async def _parse_pdf(file: UploadFile) -> dict:
+    path = await pdf_extract.spool_to_path(file.file)
+    try:
+        result = await pdf_extract.extract_text(path)
+    except pdf_extract.PdfError as e:
+        raise HTTPException(status_code=400, detail=f"PDF illisible: {e}")
+    finally:
+        pdf_extract.remove_quietly(path)
+    # Coupé par le budget de temps : pas mis en cache, le prochain essai peut aller au bout
+    result["partial"] = pdf_extract.is_partial(result["pages"], result["total_pages"])
+    return result
+
+async def _resume_text(resume: Optional[str], resume_id: Optional[str]) -> str:
+    """Texte du CV : `resume_id` (document importé) prioritaire sur `resume`."""
+    if resume_id:
+        doc = await docstore.lookup(resume_id)
+        if doc is None:
+            raise HTTPException(status_code=404, detail="Document inconnu ou expiré : réimporter le fichier ou envoyer `resume`.")
+        # Texte normalisé à l'import : en-têtes / pieds de page déjà dédoublonnés par page
+        return doc["normalized"] or doc["text"]
+    if resume is None:
+        raise HTTPException(status_code=422, detail="`resume` ou `resume_id` requis.")
+    return resume
 
 # ---------- Fallback PDF simple ----------
 @app.post("/ingest/pdf")
-async def ingest_pdf(file: UploadFile = File(...)):
+async def ingest_pdf(file: UploadFile = File(...), stream: bool = False):
     if not file:
         raise HTTPException(status_code=400, detail="file required")
     # contrôle MIME & extension
     allowed = {"application/pdf", "application/octet-stream"}
     if file.content_type not in allowed or not (file.filename or "").lower().endswith(".pdf"):
         raise HTTPException(status_code=415, detail=f"PDF only")
-    raw = await file.read()
-    reader = PdfReader(BytesIO(raw))
-    texts = []
-    for page in getattr(reader, "pages", []):
-        texts.append(page.extract_text() or "")
-    text = "\n".join(texts)
-    return {"ok": True, "chars": len(text), "text": text[:200000]}
+
+    if stream:
+        # NDJSON : une ligne par page, puis un récapitulatif
+        doc_id = await docstore.document_id(file.file)
+        doc = await docstore.lookup(doc_id)
+
+        async def replay():
+            # Déjà importé : pages relues depuis le store, sans extraction
+            text, offsets = doc["text"], doc.get("page_offsets") or [0]
+            for index, start in enumerate(offsets):
+                end = offsets[index + 1] - 1 if index + 1 < len(offsets) else len(text)
+                yield json.dumps({"page": index + 1, "text": text[start:end]}, ensure_ascii=False) + "\n"
+            yield json.dumps({
+                "ok": True, "done": True, "pages": doc.get("pages", len(offsets)),
+                "total_pages": doc.get("total_pages", len(offsets)), "truncated": doc.get("truncated", False),
+                **docstore.summary(doc), "cached": True,
+            }) + "\n"
+
+        async def lines():
+            pages = pdf_extract.PageStream(path)
+            texts = []
+            try:
+                async for index, text in pages:
+                    texts.append(text)
+                    yield json.dumps({"page": index + 1, "text": text}, ensure_ascii=False) + "\n"
+                new_doc = await asyncio.to_thread(
+                    docstore.build_document, doc_id, "pdf", "\n".join(texts),
+                    pages=pages.pages, total_pages=pages.total_pages, truncated=pages.truncated,
+                    page_offsets=pdf_extract.page_offsets(texts),
+                    partial=pdf_extract.is_partial(pages.pages, pages.total_pages),
+                )
+                await docstore.store(new_doc)
+                yield json.dumps({
+                    "ok": True, "done": True, "pages": pages.pages,
+                    "total_pages": pages.total_pages, "truncated": pages.truncated,
+                    **docstore.summary(new_doc), "cached": False,
+                }) + "\n"
+            except pdf_extract.PdfError as e:
+                yield json.dumps({"ok": False, "done": True, "error": f"PDF illisible: {e}"}) + "\n"
+            finally:
+                pdf_extract.remove_quietly(path)
+        if doc is not None:
+            return StreamingResponse(replay(), media_type="application/x-ndjson")
+        path = await pdf_extract.spool_to_path(file.file)
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    doc, cached = await docstore.get_or_parse(file.file, "pdf", lambda: _parse_pdf(file))
+    text = doc["text"]
+    return {
+        "ok": True, "chars": len(text), "text": text,
+        "pages": doc.get("pages"), "total_pages": doc.get("total_pages"), "truncated": doc.get("truncated"),
+        **docstore.summary(doc), "cached": cached,
+    }
+
+# ---------- Mode job ----------
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def _run_or_enqueue(kind: str, mode: str, run):
+    """
+    mode=sync (défaut) : exécute et renvoie le résultat.
+    mode=job : 202 + id tout de suite ; résultat via GET /jobs/{id} ou /jobs/{id}/events.
+    """
+    if mode != "job":
+        return await run()
+    try:
+        job = await job_manager.submit(kind, run)
+    except QueueFull as e:
+        return too_many_requests(e.retry_after)
+    return JSONResponse(public_view(job), status_code=202, headers={"Location": f"/jobs/{job['id']}"})
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job inconnu ou expiré.")
+    return public_view(job)
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """SSE : un événement `status` à chaque changement, puis `done` (ou `error`) avec le résultat."""
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job inconnu ou expiré.")
+
+    async def events():
+        current = job
+        last = None
+        while True:
+            if current is None:
+                yield _sse("error", {"error": "Job inconnu ou expiré."})
+                return
+            if current["status"] in TERMINAL:
+                yield _sse("done" if current["status"] == "done" else "error", public_view(current))
+                return
+            if current["status"] != last:
+                last = current["status"]
+                yield _sse("status", public_view(current))
+            else:
+                yield ": keep-alive\n\n"
+            await job_manager.wait_for_change(job_id, timeout=15)
+            current = await job_manager.get(job_id)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 # ---------- Analyse LLM ----------
 class AnalyzeTextIn(BaseModel):
-    resume: str
+    resume: Optional[str] = None
+    resume_id: Optional[str] = None  # document importé (/resume/upload, /ingest/pdf) : remplace `resume`
     job: str
     language: str = "fr"
     gender: str = "auto"
+    llm: bool = True  # False : pré-score local uniquement, réponse immédiate sans appel LLM
+
+PRESCORE_INLINE_CHARS = 20_000  # au-delà, tokenisation dans un thread (quelques ms de CPU)
+
+async def _prescore(payload: AnalyzeTextIn) -> Optional[dict]:
+    scoring = registry.get("scoring")
+    if scoring is None:
+        if not payload.llm:
+            raise HTTPException(status_code=501, detail="Pré-score local indisponible (scoring.py manquant/erreur).")
+        return None
+    if len(payload.resume or "") + len(payload.job or "") <= PRESCORE_INLINE_CHARS:
+        return scoring.prescore(payload.resume, payload.job)
+    return await asyncio.to_thread(scoring.prescore, payload.resume, payload.job)
+
+def _prescore_result(prescore: dict) -> dict:
+    return {"ok": True, "llm": False, "score": prescore["score"], "mots_cles": prescore["matched"], "prescore": prescore}
 
 @app.post("/analyze-text")
-def analyze_text(payload: AnalyzeTextIn):
-    try:
-        from .llm import analyze_with_llm
-    except Exception:
-        raise HTTPException(status_code=501, detail="Analyse LLM indisponible (llm.py manquant/erreur).")
-    return analyze_with_llm(payload.resume, payload.job, payload.language, payload.gender)
+async def analyze_text(payload: AnalyzeTextIn, mode: str = "sync"):
+    payload.resume = await _resume_text(payload.resume, payload.resume_id)
+    prescore = await _prescore(payload)
+    if not payload.llm:
+        return _prescore_result(prescore)
+    llm = _feature("llm", "Analyse LLM indisponible (llm.py manquant/erreur).")
+
+    async def run():
+        result = await llm.analyze_with_llm(payload.resume, payload.job, payload.language, payload.gender)
+        return {**result, "prescore": prescore} if prescore is not None else result
+
+    return await _run_or_enqueue("analyze-text", mode, run)
+
+@app.post("/analyze-text/stream")
+async def analyze_text_stream(payload: AnalyzeTextIn):
+    """
+    Même analyse, en Server-Sent Events : `prescore` (local) d'abord, puis les tokens,
+    puis chaque clé JSON dès qu'elle est complète.
+    """
+    payload.resume = await _resume_text(payload.resume, payload.resume_id)
+    prescore = await _prescore(payload)
+    if payload.llm:
+        llm = _feature("llm", "Analyse LLM indisponible (llm.py manquant/erreur).")
+
+    async def events():
+        if prescore is not None:
+            yield _sse("prescore", prescore)
+        if not payload.llm:
+            yield _sse("done", _prescore_result(prescore))
+            return
+        async for event, data in llm.stream_analyze_with_llm(payload.resume, payload.job, payload.language, payload.gender):
+            if event == "done" and prescore is not None:
+                data = {**data, "prescore": prescore}
+            yield _sse(event, data)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ---------- Analyse en lot ----------
+class AnalyzeBatchIn(BaseModel):
+    # 1 CV vs N offres (resume + jobs) ou N CV vs 1 offre (job + resumes)
+    resume: Optional[str] = None
+    resume_id: Optional[str] = None
+    jobs: List[str] = []
+    job: Optional[str] = None
+    resumes: List[str] = []
+    resume_ids: List[str] = []   # indexés à la suite de `resumes`
+    language: str = "fr"
+    gender: str = "auto"
+    concurrency: int = 4
+    top_k: Optional[int] = None  # LLM seulement pour les k meilleurs pré-scores (None : selon le budget LLM restant)
+    llm: bool = True             # False : pré-scores seuls (équivaut à top_k=0)
+
+@app.post("/analyze-batch")
+async def analyze_batch(payload: AnalyzeBatchIn, request: Request):
+    """
+    NDJSON : une ligne par élément (avec son index et son rang au pré-score), puis un récapitulatif.
+    Les éléments hors top_k sortent tout de suite avec leur seul pré-score ; les autres
+    suivent dans l'ordre de complétion des appels LLM.
+    """
+    batch = _feature("batch", "Analyse LLM indisponible (llm.py manquant/erreur).")
+    if payload.resume_id:
+        payload.resume = await _resume_text(None, payload.resume_id)
+    if payload.resume_ids:
+        payload.resumes = payload.resumes + [await _resume_text(None, i) for i in payload.resume_ids]
+    if payload.resume is not None and payload.jobs and not payload.resumes:
+        pairs = [(payload.resume, job) for job in payload.jobs]
+    elif payload.job is not None and payload.resumes and not payload.jobs:
+        pairs = [(resume, payload.job) for resume in payload.resumes]
+    else:
+        raise HTTPException(status_code=422, detail="Fournir soit resume + jobs, soit job + resumes.")
+    if len(pairs) > batch.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Trop d'éléments (max {batch.BATCH_MAX_ITEMS}).")
+    # Chaque appel LLM du lot compte dans le même budget par client que /analyze-text
+    client = request.client.host if request.client else "127.0.0.1"
+    top_k = payload.top_k if payload.llm else 0
+    if top_k is None:
+        # Par défaut : LLM pour autant de meilleurs pré-scores que le budget le permet, pré-score seul au-delà
+        top_k = int(rate_limiter.available(LLM_BUDGET_ROUTE, client))
+    llm_calls = min(max(0, top_k), len(pairs))
+    if llm_calls:
+        budget = rate_limiter.burst(LLM_BUDGET_ROUTE)
+        if llm_calls > budget:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Au plus {int(budget)} analyses LLM par lot : réduire top_k (pré-scores seuls au-delà).",
+            )
+        retry_after = rate_limiter.check(LLM_BUDGET_ROUTE, client, llm_calls)
+        if retry_after:
+            return too_many_requests(retry_after)
+    items = batch.run_batch(pairs, payload.language, payload.gender, payload.concurrency, top_k)
+    return StreamingResponse(batch.ndjson(items), media_type="application/x-ndjson")
 
 # ---------- Simulation entretien ----------
 @app.post("/interview/generate")
-def interview_generate(payload: Dict[str, Any] = Body(...)):
-    try:
-        from .interview import generate_questions
-    except Exception:
-        raise HTTPException(status_code=501, detail="Module interview indisponible.")
-    return {
-        "questions": generate_questions(
-            payload.get("resume", "")[:20000],
+async def interview_generate(payload: Dict[str, Any] = Body(...), mode: str = "sync"):
+    interview = _feature("interview", "Module interview indisponible.")
+    resume = await _resume_text(payload.get("resume", ""), payload.get("resume_id"))
+
+    async def run():
+        questions = await run_in_threadpool(
+            interview.generate_questions,
+            resume[:20000],
             payload.get("job", "")[:8000],
             payload.get("language", "fr"),
         )
-    }
+        return {"questions": questions}
+
+    return await _run_or_enqueue("interview/generate", mode, run)
 
 @app.post("/interview/score")
 def interview_score(payload: Dict[str, Any] = Body(...)):
-    try:
-        from .interview import score_answer
-    except Exception:
-        raise HTTPException(status_code=501, detail="Module interview indisponible.")
-    return score_answer(payload.get("answer", "")[:4000], payload.get("job", "")[:4000])
+    interview = _feature("interview", "Module interview indisponible.")
+    return interview.score_answer(payload.get("answer", "")[:4000], payload.get("job", "")[:4000])
 
 # ---------- Réécriture CV ----------
 @app.post("/cv/rewrite")
-def cv_rewrite(payload: Dict[str, Any] = Body(...)):
-    try:
-        from .rewriter import rewrite_resume
-    except Exception:
-        raise HTTPException(status_code=501, detail="Module rewriter indisponible.")
-    return rewrite_resume(
-        payload.get("resume", "")[:20000],
+async def cv_rewrite(payload: Dict[str, Any] = Body(...), mode: str = "sync"):
+    rewriter = _feature("rewriter", "Module rewriter indisponible.")
+    resume = await _resume_text(payload.get("resume", ""), payload.get("resume_id"))
+    return await _run_or_enqueue("cv/rewrite", mode, lambda: run_in_threadpool(
+        rewriter.rewrite_resume,
+        resume[:20000],
         payload.get("job", "")[:8000],
         payload.get("language", "fr"),
-    )
+    ))
 
 # ---------- LinkedIn ----------
 class LinkedinPdfIn(BaseModel):
@@ -164,25 +477,21 @@ class LinkedinPdfIn(BaseModel):
     full_name: str = ""
 
 @app.post("/linkedin/optimize")
-def linkedin_optimize(payload: Dict[str, Any] = Body(...)):
-    try:
-        from .linkedin import optimize_linkedin
-    except Exception:
-        raise HTTPException(status_code=501, detail="Module linkedin indisponible.")
-    return optimize_linkedin(
-        payload.get("resume", "")[:20000],
+async def linkedin_optimize(payload: Dict[str, Any] = Body(...), mode: str = "sync"):
+    linkedin = _feature("linkedin", "Module linkedin indisponible.")
+    resume = await _resume_text(payload.get("resume", ""), payload.get("resume_id"))
+    return await _run_or_enqueue("linkedin/optimize", mode, lambda: run_in_threadpool(
+        linkedin.optimize_linkedin,
+        resume[:20000],
         payload.get("job", "")[:8000],
         payload.get("language", "fr"),
         payload.get("gender", "auto"),
-    )
+    ))
 
 @app.post("/linkedin/export/pdf")
 def linkedin_export_pdf(payload: LinkedinPdfIn):
-    try:
-        from .exporter_linkedin import export_linkedin_pdf
-    except Exception:
-        raise HTTPException(status_code=501, detail="exporter_linkedin indisponible.")
-    pdf = export_linkedin_pdf(payload.headline, payload.about, full_name=payload.full_name)
+    exporter_linkedin = _feature("exporter_linkedin", "exporter_linkedin indisponible.")
+    pdf = exporter_linkedin.export_linkedin_pdf(payload.headline, payload.about, full_name=payload.full_name)
     return Response(
         content=pdf,
         media_type="application/pdf",
@@ -191,21 +500,15 @@ def linkedin_export_pdf(payload: LinkedinPdfIn):
 
 @app.post("/linkedin/export/pdf-b64")
 def linkedin_export_pdf_b64(payload: LinkedinPdfIn):
-    try:
-        from .exporter_linkedin import export_linkedin_pdf
-    except Exception:
-        raise HTTPException(status_code=501, detail="exporter_linkedin indisponible.")
-    pdf = export_linkedin_pdf(payload.headline, payload.about, full_name=payload.full_name)
+    exporter_linkedin = _feature("exporter_linkedin", "exporter_linkedin indisponible.")
+    pdf = exporter_linkedin.export_linkedin_pdf(payload.headline, payload.about, full_name=payload.full_name)
     b64 = base64.b64encode(pdf).decode("ascii")
     return {"filename": "linkedin.pdf", "mime": "application/pdf", "data": b64}
 
 # ---------- Exports génériques ----------
 @app.post("/export/docx")
 def export_as_docx(payload: Dict[str, Any] = Body(...)):
-    try:
-        from .exporter import export_docx
-    except Exception:
-        raise HTTPException(status_code=501, detail="exporter.export_docx indisponible.")
+    exporter = _feature("exporter", "exporter.export_docx indisponible.")
     data = {
         "title": payload.get("title", "CV optimisé"),
         "headline": payload.get("headline"),
@@ -213,7 +516,7 @@ def export_as_docx(payload: Dict[str, Any] = Body(...)):
         "skills": payload.get("skills", []),
         "about": payload.get("about", ""),
     }
-    content = export_docx(data)
+    content = exporter.export_docx(data)
     return StreamingResponse(
         iter([content]),
         media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
@@ -222,13 +525,10 @@ def export_as_docx(payload: Dict[str, Any] = Body(...)):
 
 @app.post("/export/pdf")
 def export_as_pdf(payload: Dict[str, Any] = Body(...)):
-    try:
-        from .exporter import export_pdf
-    except Exception:
-        raise HTTPException(status_code=501, detail="exporter.export_pdf indisponible.")
+    exporter = _feature("exporter", "exporter.export_pdf indisponible.")
     title = payload.get("title", "Lettre")
     text = payload.get("text", "")
-    pdf_bytes = export_pdf(text[:20000], title[:200])
+    pdf_bytes = exporter.export_pdf(text[:20000], title[:200])
     return Response(
         content=pdf_bytes,
         media_type="application/pdf",
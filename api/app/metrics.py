@@ -0,0 +1,194 @@
+# api/app/metrics.py
+"""
+Métriques Prometheus de l'API.
+
+- Labels bornés : la route est le template FastAPI ("/jobs/{job_id}"), jamais le chemin brut.
+- Mode multiprocess : si PROMETHEUS_MULTIPROC_DIR est défini (répertoire vide, partagé par
+  les workers uvicorn), /metrics agrège tous les workers au lieu d'un seul au hasard.
+  Le répertoire doit être vidé avant de lancer uvicorn (pas depuis un worker : les autres
+  y écrivent déjà).
+- Jauges d'état (threadpool, ratio de cache) : échantillonnées en continu par chaque worker.
+"""
+import os, time, asyncio
+from typing import Iterable
+
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess, REGISTRY,
+)
+from starlette.routing import BaseRoute, Match
+
+MULTIPROC = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR") or os.getenv("prometheus_multiproc_dir"))
+
+UNMATCHED = "__unmatched__"
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+# ---------- HTTP ----------
+REQUEST_COUNT = Counter("cvagent_requests_total", "Total API requests", ["route", "method", "status"])
+REQUEST_LATENCY = Histogram("cvagent_request_latency_seconds", "Latency", ["route"], buckets=_LATENCY_BUCKETS)
+REQUESTS_IN_FLIGHT = Gauge(
+    "cvagent_requests_in_flight", "HTTP requests being processed", multiprocess_mode="livesum"
+)
+
+# ---------- Upstream LLM ----------
+LLM_LATENCY = Histogram(
+    "cvagent_llm_request_seconds", "Upstream LLM call latency (per attempt)",
+    ["provider", "status"], buckets=_LATENCY_BUCKETS,
+)
+LLM_RETRIES = Counter("cvagent_llm_retries_total", "Upstream LLM retries", ["provider", "reason"])
+LLM_TOKENS = Counter("cvagent_llm_tokens_total", "Tokens billed by the upstream LLM", ["provider", "kind"])
+LLM_CIRCUIT_STATE = Gauge(
+    "cvagent_llm_circuit_state", "Circuit breaker per backend (0 closed, 1 half-open, 2 open)",
+    ["backend"], multiprocess_mode="max",
+)
+LLM_CONCURRENCY_LIMIT = Gauge(
+    "cvagent_llm_concurrency_limit", "Adaptive (AIMD) concurrency limit per backend",
+    ["backend"], multiprocess_mode="livesum",
+)
+LLM_HEDGES = Counter("cvagent_llm_hedged_requests_total", "Hedged upstream requests", ["backend", "outcome"])
+LLM_REJECTED = Counter(
+    "cvagent_llm_rejected_total", "LLM calls refused before reaching the upstream", ["backend", "reason"]
+)  # reason: circuit_open | overloaded | deadline
+PROMPT_TOKENS_ESTIMATED = Counter(
+    "cvagent_prompt_tokens_estimated_total", "Locally estimated CV+offer prompt tokens, before/after compaction",
+    ["stage"],
+)  # stage: raw | compacted
+
+# ---------- Extraction PDF ----------
+PDF_PAGES = Histogram(
+    "cvagent_pdf_pages", "Pages extracted per PDF request", buckets=(1, 2, 3, 5, 10, 20, 40, 60, 100)
+)
+PDF_SECONDS = Histogram(
+    "cvagent_pdf_extraction_seconds", "PDF extraction wall time per request",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30),
+)
+PDF_POOL_RECYCLED = Counter(
+    "cvagent_pdf_pool_recycled_total", "PDF pools replaced because a worker overran its time budget"
+)
+PDF_QUEUE = Gauge(
+    "cvagent_pdf_tasks_pending", "Page-range tasks submitted to the PDF process pool and not finished",
+    multiprocess_mode="livesum",
+)
+
+# ---------- Jobs asynchrones ----------
+JOBS_QUEUE_DEPTH = Gauge("cvagent_jobs_queued", "Jobs waiting in the bounded queue", multiprocess_mode="livesum")
+JOBS_TOTAL = Counter("cvagent_jobs_total", "Job state transitions", ["kind", "status"])
+
+# ---------- Démarrage ----------
+STARTUP_SECONDS = Gauge(
+    "cvagent_startup_seconds", "Worker startup time by phase (imports, warmup, total)",
+    ["phase"], multiprocess_mode="max",
+)
+CAPABILITY_UP = Gauge(
+    "cvagent_capability_loaded", "Feature module imported at startup (1) or unavailable (0)",
+    ["capability"], multiprocess_mode="min",
+)
+
+# ---------- Saturation ----------
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.25"))  # 0 => pas de mesure
+RUNTIME_SAMPLE_INTERVAL = 1.0  # jauges d'état écrites par chaque worker (lues par tous en multiprocess)
+EVENT_LOOP_LAG = Histogram(
+    "cvagent_event_loop_lag_seconds", "Delay of a periodic timer on the event loop (time spent blocked)",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+THREADPOOL_IN_USE = Gauge(
+    "cvagent_threadpool_in_use", "Threadpool workers busy (sync handlers, to_thread)",
+    multiprocess_mode="livesum",
+)
+THREADPOOL_SIZE = Gauge("cvagent_threadpool_size", "Threadpool capacity", multiprocess_mode="livesum")
+
+# ---------- Cache ----------
+CACHE_EVENTS = Counter(
+    "cvagent_cache_events_total", "Result cache lookups", ["cache", "result"]
+)  # result: hit | disk_hit | miss | coalesced
+CACHE_HIT_RATIO = Gauge(
+    "cvagent_cache_hit_ratio", "Share of cache lookups served without computing (since start)",
+    ["cache"], multiprocess_mode="liveall",
+)
+_cache_tallies: dict[str, list[int]] = {}  # cache -> [servis sans calcul, total]
+
+def record_cache(cache: str, result: str):
+    CACHE_EVENTS.labels(cache=cache, result=result).inc()
+    tally = _cache_tallies.setdefault(cache, [0, 0])
+    tally[1] += 1
+    if result != "miss":
+        tally[0] += 1
+
+
+def _sample_runtime():
+    """Jauges d'état de ce worker (doit tourner dans son event loop)."""
+    try:
+        import anyio.to_thread
+        limiter = anyio.to_thread.current_default_thread_limiter()
+        THREADPOOL_IN_USE.set(limiter.borrowed_tokens)
+        THREADPOOL_SIZE.set(limiter.total_tokens)
+    except Exception:
+        pass
+    for cache, (served, total) in _cache_tallies.items():
+        CACHE_HIT_RATIO.labels(cache=cache).set(served / total if total else 0.0)
+
+async def sample_runtime(interval: float = RUNTIME_SAMPLE_INTERVAL):
+    """Tâche de fond : chaque worker publie ses jauges, pas seulement celui qui sert /metrics."""
+    while True:
+        _sample_runtime()
+        await asyncio.sleep(interval)
+
+async def monitor_loop_lag(interval: float = LOOP_LAG_INTERVAL):
+    """Tâche de fond : retard d'un timer périodique = durée pendant laquelle la boucle était bloquée."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - start - interval))
+
+def render_latest() -> bytes:
+    _sample_runtime()
+    if MULTIPROC:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+def mark_process_dead():
+    if MULTIPROC:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+class MetricsMiddleware:
+    """ASGI pur. Label `route` = template de la route matchée (cardinalité bornée)."""
+
+    def __init__(self, app, routes: Iterable[BaseRoute] = ()):
+        self.app = app
+        self.routes = routes
+
+    def _route_template(self, scope) -> str:
+        route = scope.get("route")
+        if route is not None:
+            return getattr(route, "path", UNMATCHED)
+        # Réponse émise avant le routage (429, 413...) : on retrouve le template
+        for r in self.routes:
+            match, _ = r.matches(scope)
+            if match != Match.NONE:
+                return getattr(r, "path", UNMATCHED)
+        return UNMATCHED
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            route = self._route_template(scope)
+            REQUEST_LATENCY.labels(route=route).observe(time.perf_counter() - start)
+            REQUEST_COUNT.labels(route=route, method=scope["method"], status=status).inc()
@@ -0,0 +1,174 @@
+# api/app/pdf.py
+from __future__ import annotations
+
+import os, time, shutil, asyncio, logging, tempfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import AsyncIterator, BinaryIO, Optional
+
+from .metrics import PDF_PAGES, PDF_SECONDS, PDF_QUEUE, PDF_POOL_RECYCLED
+from .pdf_worker import PdfReader, PdfError, count_pages, extract_range, ping
+
+PDF_MAX_PAGES      = int(os.getenv("PDF_MAX_PAGES", "60"))        # cap par requête
+PDF_TIME_BUDGET    = float(os.getenv("PDF_TIME_BUDGET", "20"))    # secondes par requête
+PDF_WORKERS        = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+PDF_KILL_GRACE     = float(os.getenv("PDF_KILL_GRACE", "2"))      # au-delà du budget : worker tué
+
+log = logging.getLogger(__name__)
+
+
+# ---------- Côté event loop ----------
+_pool: Optional[ProcessPoolExecutor] = None
+
+def get_pool() -> ProcessPoolExecutor:
+    # spawn : pas de fork d'un process multi-thread (uvicorn, httpx...)
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=get_context("spawn"))
+    return _pool
+
+async def warm_pool():
+    """Démarre tous les workers maintenant plutôt qu'au premier PDF reçu."""
+    loop = asyncio.get_running_loop()
+    pool = get_pool()
+    await asyncio.gather(*(loop.run_in_executor(pool, ping) for _ in range(PDF_WORKERS)))
+
+def _reap(pool: ProcessPoolExecutor, stragglers: list[Future]):
+    """
+    Tâches toujours en cours `PDF_KILL_GRACE` s après le budget : une page pathologique
+    bloque le worker (pypdf n'est pas interruptible). Le pool est remplacé et ses process tués ;
+    les tâches des autres requêtes encore dessus échouent (PdfError).
+    """
+    global _pool
+    if all(f.done() for f in stragglers):
+        return
+    log.warning("pdf worker overran its time budget, recycling the pool")
+    PDF_POOL_RECYCLED.inc()
+    if _pool is pool:
+        _pool = None
+    processes = list((getattr(pool, "_processes", None) or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+
+def _watch(pool: ProcessPoolExecutor, futures: list[Future], wall_deadline: float):
+    """Annule les tâches pas encore démarrées ; celles en cours ont jusqu'au budget + la marge."""
+    stragglers = [f for f in futures if not f.cancel() and not f.done()]
+    if stragglers:
+        delay = max(0.0, wall_deadline - time.time()) + PDF_KILL_GRACE
+        try:
+            asyncio.get_running_loop().call_later(delay, _reap, pool, stragglers)
+        except RuntimeError:  # générateur finalisé hors de la boucle (arrêt)
+            pass
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def _copy_to_temp(src: BinaryIO) -> str:
+    src.seek(0)
+    with tempfile.NamedTemporaryFile(prefix="cvagent-", suffix=".pdf", delete=False) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+        return dst.name
+
+async def spool_to_path(src: BinaryIO) -> str:
+    """Copie en flux le fichier spoolé de l'upload vers un chemin lisible par les workers."""
+    return await asyncio.to_thread(_copy_to_temp, src)
+
+def remove_quietly(path: str):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+class PageStream:
+    """
+    Extraction page par page, en parallèle par plages, dans le pool de process.
+    Respecte PDF_MAX_PAGES et PDF_TIME_BUDGET ; `truncated` indique un résultat partiel.
+    """
+
+    def __init__(self, path: str, max_pages: int = PDF_MAX_PAGES, budget: float = PDF_TIME_BUDGET):
+        self.path = path
+        self.max_pages = max_pages
+        self.budget = budget
+        self.total_pages = 0
+        self.pages = 0
+        self.truncated = False
+
+    async def __aiter__(self) -> AsyncIterator[tuple[int, str]]:
+        pool = get_pool()
+        started = time.monotonic()
+        deadline = started + self.budget
+        wall_deadline = time.time() + self.budget  # horloge des workers (autre process)
+
+        counting = pool.submit(count_pages, self.path)
+        try:
+            self.total_pages = await asyncio.wait_for(asyncio.wrap_future(counting), self.budget)
+        except asyncio.TimeoutError:
+            _watch(pool, [counting], wall_deadline)
+            raise PdfError("time budget exceeded")
+        except PdfError:
+            raise
+        except Exception as e:
+            raise PdfError(str(e) or e.__class__.__name__)
+
+        n = min(self.total_pages, self.max_pages)
+        self.truncated = n < self.total_pages
+        step = max(1, PDF_PAGES_PER_TASK)
+        futures = [
+            (start, min(start + step, n), pool.submit(extract_range, self.path, start, min(start + step, n), wall_deadline))
+            for start in range(0, n, step)
+        ]
+        for _, _, fut in futures:
+            PDF_QUEUE.inc()
+            fut.add_done_callback(lambda _f: PDF_QUEUE.dec())
+        try:
+            for start, stop, fut in futures:
+                remaining = deadline - time.monotonic()
+                try:
+                    texts = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(fut)), max(remaining, 0))
+                except asyncio.TimeoutError:
+                    self.truncated = True
+                    return
+                except Exception as e:
+                    raise PdfError(str(e) or e.__class__.__name__)
+                for offset, text in enumerate(texts):
+                    self.pages += 1
+                    yield start + offset, text
+                if len(texts) < stop - start:
+                    # Plage interrompue par le budget dans le worker : la suite n'est pas contiguë
+                    self.truncated = True
+                    return
+        finally:
+            # Libère les plages pas encore démarrées (budget dépassé / client parti)
+            _watch(pool, [fut for _, _, fut in futures], wall_deadline)
+            PDF_PAGES.observe(self.pages)
+            PDF_SECONDS.observe(time.monotonic() - started)
+
+def page_offsets(texts: list[str]) -> list[int]:
+    """Début de chaque page dans "\\n".join(texts)."""
+    offsets, pos = [], 0
+    for text in texts:
+        offsets.append(pos)
+        pos += len(text) + 1
+    return offsets
+
+def is_partial(pages: int, total_pages: int, max_pages: int = PDF_MAX_PAGES) -> bool:
+    """Coupé par le budget de temps, et pas seulement par max_pages."""
+    return pages < min(total_pages, max_pages)
+
+async def extract_text(path: str, max_pages: int = PDF_MAX_PAGES, budget: float = PDF_TIME_BUDGET) -> dict:
+    stream = PageStream(path, max_pages, budget)
+    texts = [text async for _, text in stream]
+    return {
+        "text": "\n".join(texts),
+        "page_offsets": page_offsets(texts),
+        "pages": stream.pages,
+        "total_pages": stream.total_pages,
+        "truncated": stream.truncated,
+    }
@@ -0,0 +1,52 @@
+# api/app/pdf_worker.py
+"""
+Fonctions exécutées dans les process du pool PDF (voir pdf.py).
+Module volontairement minimal : c'est tout ce qu'un worker "spawn" importe.
+"""
+import math, mmap, time
+
+try:
+    from pypdf import PdfReader
+except Exception:
+    from PyPDF2 import PdfReader
+
+
+class PdfError(Exception):
+    pass
+
+
+def ping() -> bool:
+    # Tâche vide : force le spawn du worker (et l'import de pypdf) au démarrage
+    return True
+
+def _open_reader(path: str):
+    f = open(path, "rb")
+    try:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:  # fichier vide
+        f.close()
+        raise PdfError("empty file")
+    return f, mm, PdfReader(mm)
+
+def count_pages(path: str) -> int:
+    f, mm, reader = _open_reader(path)
+    try:
+        return len(reader.pages)
+    finally:
+        mm.close(); f.close()
+
+def extract_range(path: str, start: int, stop: int, deadline: float = math.inf) -> list[str]:
+    """
+    Textes des pages [start, stop). S'arrête à `deadline` (time.time()) : la liste peut
+    être plus courte, le worker est rendu au pool au lieu de finir une plage inutile.
+    """
+    f, mm, reader = _open_reader(path)
+    try:
+        texts = []
+        for i in range(start, stop):
+            if time.time() >= deadline:
+                break
+            texts.append(reader.pages[i].extract_text() or "")
+        return texts
+    finally:
+        mm.close(); f.close()
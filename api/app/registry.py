@@ -0,0 +1,87 @@
+# api/app/registry.py
+"""
+Registre des capacités : chaque module optionnel est importé une seule fois au démarrage
+(lifespan) et sa disponibilité est enregistrée. Les handlers y lisent le module en O(1)
+au lieu de l'importer à chaque requête ; une erreur d'import est journalisée au démarrage
+au lieu d'apparaître en 501 au premier appel.
+"""
+from __future__ import annotations
+
+import time, logging, importlib
+from types import ModuleType
+from typing import Optional
+
+log = logging.getLogger(__name__)
+
+# capacité -> module (relatif au package app)
+FEATURES = {
+    "extract": ".extract",
+    "scoring": ".scoring",
+    "llm": ".llm",
+    "batch": ".batch",
+    "interview": ".interview",
+    "rewriter": ".rewriter",
+    "linkedin": ".linkedin",
+    "exporter": ".exporter",
+    "exporter_linkedin": ".exporter_linkedin",
+}
+
+
+class Capability:
+    __slots__ = ("name", "module", "error", "seconds")
+
+    def __init__(self, name: str, module: Optional[ModuleType], error: Optional[str], seconds: float):
+        self.name = name
+        self.module = module
+        self.error = error
+        self.seconds = seconds
+
+    def view(self) -> dict:
+        view = {"loaded": self.module is not None, "import_ms": round(self.seconds * 1000, 1)}
+        if self.error:
+            view["error"] = self.error
+        return view
+
+
+class Registry:
+    def __init__(self, features: dict[str, str], package: str = __package__):
+        self.features = features
+        self.package = package
+        self._caps: dict[str, Capability] = {}
+        self.warmup: dict[str, str] = {}
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self._caps)
+
+    def load(self) -> dict[str, Capability]:
+        """Importe tous les modules (idempotent). Module absent : warning ; module cassé : erreur + traceback."""
+        if self._caps:
+            return self._caps
+        for name, module_name in self.features.items():
+            start = time.perf_counter()
+            module, error = None, None
+            try:
+                module = importlib.import_module(module_name, self.package)
+            except ModuleNotFoundError as e:
+                error = f"{e.__class__.__name__}: {e}"
+                if e.name and e.name.endswith(module_name.lstrip(".")):
+                    log.warning("capability %s unavailable: %s", name, error)
+                else:
+                    log.error("capability %s failed to import", name, exc_info=True)
+            except Exception as e:
+                error = f"{e.__class__.__name__}: {e}"
+                log.error("capability %s failed to import", name, exc_info=True)
+            self._caps[name] = Capability(name, module, error, time.perf_counter() - start)
+        return self._caps
+
+    def get(self, name: str) -> Optional[ModuleType]:
+        """Module de la capacité, ou None si indisponible."""
+        cap = self._caps.get(name) if self._caps else self.load().get(name)
+        return cap.module if cap is not None else None
+
+    def status(self) -> dict:
+        return {name: cap.view() for name, cap in self.load().items()}
+
+
+registry = Registry(FEATURES)
@@ -0,0 +1,210 @@
+# api/app/scoring.py
+"""
+Pré-score local, sans LLM : CV vs offre en BM25 sur des vecteurs de termes creux.
+Donne un score 0-100 et les mots-clés de l'offre trouvés / manquants dans le CV.
+Lexiques (mots vides FR/EN, compétences et alias) compilés une fois à l'import.
+"""
+from __future__ import annotations
+
+import re, hashlib, threading, unicodedata
+from collections import Counter, OrderedDict
+from typing import Optional
+
+BM25_K1 = 1.2
+BM25_B  = 0.3         # normalisation de longueur douce : un CV détaillé n'est pas pénalisé
+REF_DOC_TOKENS = 400  # longueur de référence d'un CV (pas de corpus pour une moyenne)
+SKILL_WEIGHT = 2.5    # poids d'un terme du lexique de compétences vs un mot quelconque
+MAX_QUERY_TF = 3
+MAX_KEYWORDS = 25
+SCORE_MAX_CHARS = 60_000  # au-delà, le texte n'est pas tokenisé (coût CPU borné, même garde-fou que compact)
+
+
+# ---------- Lexiques ----------
+_STOPWORDS = """
+a au aux avec ce ces cet cette dans de des du elle elles en et eux il ils je la le les leur leurs lui ma mais me
+meme mes moi mon ne nos notre nous on ou par pas pour qu que qui quoi sa se ses son sur ta te tes toi ton tu un une
+vos votre vous est sont etre avoir ont sera seront serait fait faire plus moins tres bien sans sous entre chez vers
+afin ainsi aussi autre autres chaque comme dont donc encore etc lors non peu peut sein selon si soit tout tous toute
+toutes
+the and for with from that this these those are was were will would you your our ours has have had not but all any
+can could its into more most other such than then there their them they what when where which who why how also been
+being both each few just may might must only own same should some very via per able well
+"""
+# Vocabulaire d'annonce : présent dans toutes les offres, sans valeur pour le matching
+_GENERIC = """
+poste profil candidat candidate recherchons recherche rejoindre rejoignez mission entreprise equipe societe client
+cdi cdd stage alternance salaire remuneration avantage ans annee experience competence connaissance maitrise bonne
+bon souhaite souhaitee apprecie appreciee atout idealement minimum niveau travail travailler environnement capacite
+sens esprit forte fort qualite description responsabilite principal principale principaux nouveau nouvelle projet
+groupe secteur domaine localisation professionnel professionnelle concevoir participer assurer contribuer
+role position looking join team company years knowledge skills strong ability work working job opportunity
+requirements required preferred responsibilities including new good great excellent within across help ensure
+professional design participate contribute
+"""
+# Compétences, séparées par des virgules : "forme" ou "alias=forme canonique"
+_SKILLS = """
+python, java, javascript, js=javascript, typescript, ts=typescript, go, golang=go, rust, c++, c#, php, ruby,
+scala, kotlin, swift, matlab, sql, nosql, bash, shell, powershell, html, css, sass, react, react.js=react,
+reactjs=react, react native, angular, vue, vue.js=vue, vuejs=vue, next.js, nextjs=next.js, node.js, node=node.js,
+nodejs=node.js, express, django, flask, fastapi, spring, spring boot, .net, asp.net, laravel, symfony,
+ruby on rails, rails=ruby on rails, jquery, graphql, rest, api, apis=api, microservices, micro-services=microservices, grpc,
+kafka, rabbitmq, redis, elasticsearch, postgresql, postgres=postgresql, mysql, mariadb, oracle, mongodb, sqlite,
+cassandra, dynamodb, snowflake, bigquery, spark, hadoop, airflow, dbt, pandas, numpy, scikit-learn,
+sklearn=scikit-learn, tensorflow, pytorch, keras, machine learning, ml=machine learning,
+apprentissage automatique=machine learning, deep learning, nlp, llm, computer vision, data science,
+data engineering, data analysis, etl, power bi, powerbi=power bi, tableau, excel, looker, aws,
+amazon web services=aws, azure, gcp, google cloud=gcp, docker, kubernetes, k8s=kubernetes, terraform, ansible,
+helm, linux, unix, git, github, gitlab, jenkins, ci/cd, cicd=ci/cd, devops, sre, prometheus, grafana, datadog, nginx,
+agile, scrum, kanban, jira, confluence, tdd, uml, merise, sap, salesforce, erp, crm, seo, google analytics,
+figma, photoshop, illustrator, indesign, autocad, solidworks,
+english, anglais=english, french, francais=french, spanish, espagnol=spanish, german, allemand=german,
+management, project management, gestion de projet=project management, chef de projet=project management,
+product management, product owner, scrum master, leadership, communication, negotiation, negociation=negotiation,
+sales, vente=sales, marketing, accounting, comptabilite=accounting, finance, audit, controle de gestion,
+recruiting, recrutement=recruiting, customer service, service client=customer service,
+relation client=customer service, cybersecurity, cybersecurite=cybersecurity, security, securite=security,
+networking, reseau=networking
+"""
+
+def fold(text: str) -> str:
+    """Minuscules sans accents : "Expérience" et "experience" se comparent égal."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+_RAW_TOKEN = re.compile(r"\.net\b|[a-z0-9][a-z0-9+#]*(?:[./-][a-z0-9+#]+)*[+#]*")
+_INNER_SPLIT = re.compile(r"[./-]")
+
+def _stem(word: str) -> str:
+    # Pluriel FR/EN minimal, appliqué des deux côtés
+    if len(word) > 4 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+def _compile_skills(raw: str):
+    """-> (mot -> canonique, {premier mot: [(mots, canonique)]} triés du plus long au plus court, canoniques)."""
+    single: dict[str, str] = {}
+    phrases: dict[str, list[tuple[tuple[str, ...], str]]] = {}
+    for entry in raw.replace("\n", " ").split(","):
+        alias, _, target = entry.strip().partition("=")
+        words = tuple(_RAW_TOKEN.findall(fold(alias)))
+        if not words:
+            continue
+        target = fold(target or alias).strip()
+        if len(words) == 1:
+            single[words[0]] = target
+        else:
+            phrases.setdefault(words[0], []).append((words, target))
+    for options in phrases.values():
+        options.sort(key=lambda p: -len(p[0]))
+    return single, phrases, frozenset(single.values()) | frozenset(t for o in phrases.values() for _, t in o)
+
+_SKILL_WORDS, _SKILL_PHRASES, SKILLS = _compile_skills(_SKILLS)
+_STOP = frozenset(_STOPWORDS.split())
+_IGNORED = _STOP | frozenset(_stem(w) for w in _GENERIC.split())
+
+
+# ---------- Vecteurs ----------
+class TermVector:
+    """Vecteur creux d'un texte : fréquences des termes et longueur (en termes)."""
+    __slots__ = ("tf", "length")
+
+    def __init__(self, tf: Counter, length: int):
+        self.tf = tf
+        self.length = length
+
+def tokenize(text: str) -> list[str]:
+    """
+    Termes normalisés d'un texte : compétences ramenées à leur forme canonique
+    (multi-mots compris : "machine learning", "gestion de projet"), mots vides retirés.
+    """
+    raw = _RAW_TOKEN.findall(fold(text or ""))
+    out: list[str] = []
+    i, n = 0, len(raw)
+    while i < n:
+        word = raw[i]
+        for words, target in _SKILL_PHRASES.get(word, ()):
+            if tuple(raw[i:i + len(words)]) == words:
+                out.append(target)
+                i += len(words)
+                break
+        else:
+            i += 1
+            if word in _SKILL_WORDS:
+                out.append(_SKILL_WORDS[word])
+                continue
+            for part in (_INNER_SPLIT.split(word) if _INNER_SPLIT.search(word) else (word,)):
+                if part in _SKILL_WORDS:
+                    out.append(_SKILL_WORDS[part])
+                elif len(part) > 1 and part not in _STOP and not part.isdigit():
+                    out.append(_stem(part))
+    return out
+
+VECTOR_CACHE_SIZE = 256
+_vectors: OrderedDict[bytes, TermVector] = OrderedDict()
+_vectors_lock = threading.Lock()  # appelé depuis l'event loop et depuis des threads
+
+def vectorize(text: str) -> TermVector:
+    """
+    Mis en cache (LRU) : en lot, le même CV est comparé à N offres. La clé est un
+    condensé du texte : le cache ne retient pas le contenu des CV.
+    """
+    text = text[:SCORE_MAX_CHARS]
+    key = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    with _vectors_lock:
+        vec = _vectors.get(key)
+        if vec is not None:
+            _vectors.move_to_end(key)
+            return vec
+    terms = tokenize(text)
+    vec = TermVector(Counter(terms), len(terms))
+    with _vectors_lock:
+        _vectors[key] = vec
+        if len(_vectors) > VECTOR_CACHE_SIZE:
+            _vectors.popitem(last=False)
+    return vec
+
+def query_weights(job: TermVector) -> dict[str, float]:
+    """Termes de l'offre pondérés : compétences du lexique en tête, vocabulaire d'annonce exclu."""
+    weights = {}
+    for term, n in job.tf.items():
+        if term in _IGNORED:
+            continue
+        weights[term] = (SKILL_WEIGHT if term in SKILLS else 1.0) * min(n, MAX_QUERY_TF) ** 0.5
+    return weights
+
+
+# ---------- Score ----------
+def bm25_match(resume: TermVector, weights: dict[str, float], avg_len: float = REF_DOC_TOKENS) -> dict:
+    """
+    Score = somme pondérée des saturations BM25 des termes de l'offre dans le CV, ramenée
+    à 0-100 (1 par terme dès une occurrence dans un CV de longueur moyenne).
+    """
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * resume.length / max(avg_len, 1.0))
+    total = got = 0.0
+    matched, missing = [], []
+    for term, w in weights.items():
+        total += w
+        tf = resume.tf.get(term, 0)
+        if tf:
+            # Saturation BM25 : vaut 1 pour tf=1 dans un CV de longueur moyenne (norm = k1)
+            got += w * min(1.0, tf * (BM25_K1 + 1) / (tf + norm))
+            matched.append((w, term))
+        else:
+            missing.append((w, term))
+    matched.sort(key=lambda x: -x[0])
+    missing.sort(key=lambda x: -x[0])
+    return {
+        "score": round(100 * got / total) if total else 0,
+        "matched": [t for _, t in matched[:MAX_KEYWORDS]],
+        "missing": [t for _, t in missing[:MAX_KEYWORDS]],
+    }
+
+def prescore(resume: str, job: str, avg_len: Optional[float] = None) -> dict:
+    """Score 0-100 + mots-clés de l'offre trouvés / manquants dans le CV."""
+    return bm25_match(vectorize(resume or ""), query_weights(vectorize(job or "")), avg_len or REF_DOC_TOKENS)
+
+def prescore_many(pairs: list[tuple[str, str]]) -> list[dict]:
+    """Pré-scores d'un lot ; la longueur de référence BM25 est la moyenne des CV du lot."""
+    resumes = {r: vectorize(r or "") for r, _ in pairs}
+    avg_len = sum(v.length for v in resumes.values()) / len(resumes) if resumes else REF_DOC_TOKENS
+    return [prescore(r, j, max(avg_len, 1.0)) for r, j in pairs]
@@ -0,0 +1,556 @@
+# api/app/upstream.py
+"""
+Appels au LLM amont (API chat-completions compatible OpenAI : Groq, OpenAI, serveur local).
+
+Contrôle de la latence de queue, par backend :
+- disjoncteur : après LLM_BREAKER_FAILURES échecs consécutifs, plus d'appels pendant
+  LLM_BREAKER_COOLDOWN s, puis une seule requête de test ;
+- limiteur AIMD : concurrence +1/limite par succès, x0.5 sur 429/5xx/timeout ; au-delà,
+  attente bornée par le délai restant puis rejet (pas de file infinie) ;
+- requête "hedgée" (optionnelle) : seconde requête identique si la première dépasse le p95
+  observé, la plus rapide gagne ;
+et, par requête, un budget global (LLM_DEADLINE) partagé par les essais, le hedge et le
+basculement vers les backends suivants (LLM_BACKENDS).
+"""
+from __future__ import annotations
+
+import os, json, time, asyncio, logging
+from collections import deque
+from contextlib import AsyncExitStack, aclosing
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from .metrics import (
+    LLM_LATENCY, LLM_RETRIES, LLM_TOKENS, LLM_CIRCUIT_STATE, LLM_CONCURRENCY_LIMIT, LLM_HEDGES, LLM_REJECTED,
+)
+
+log = logging.getLogger(__name__)
+
+PROVIDER = os.getenv("PROVIDER", "groq")
+# Backends dans l'ordre de basculement : "fournisseur:modèle,fournisseur:modèle"
+# Clé et URL par fournisseur : <FOURNISSEUR>_API_KEY, <FOURNISSEUR>_BASE_URL
+LLM_BACKENDS = os.getenv("LLM_BACKENDS", "")
+DEFAULT_BASE_URLS = {
+    "groq": "https://api.groq.com/openai/v1",
+    "openai": "https://api.openai.com/v1",
+}
+DEFAULT_MODELS = {"groq": "llama-3.1-8b-instant", "openai": "gpt-4o-mini"}
+
+TIMEOUT = httpx.Timeout(30.0, connect=5.0)  # (connect, read) secondes, par essai
+RETRIES = 2
+
+LLM_DEADLINE          = float(os.getenv("LLM_DEADLINE", "25"))           # budget total par requête (s)
+LLM_BREAKER_FAILURES  = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN  = float(os.getenv("LLM_BREAKER_COOLDOWN", "15"))
+LLM_CONCURRENCY       = int(os.getenv("LLM_CONCURRENCY", "32"))          # limite AIMD initiale
+LLM_CONCURRENCY_MAX   = int(os.getenv("LLM_CONCURRENCY_MAX", "200"))
+LLM_HEDGE             = os.getenv("LLM_HEDGE", "0") in ("1", "true", "yes")
+LLM_HEDGE_MIN_DELAY   = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))   # plancher du délai de hedge (s)
+
+# Pool de connexions partagé (keep-alive, HTTP/2 si le paquet h2 est installé)
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "200"))
+LLM_MAX_KEEPALIVE   = int(os.getenv("LLM_MAX_KEEPALIVE", "50"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "1") not in ("0", "false", "no")
+
+try:
+    import h2  # noqa: F401
+    _HAS_H2 = True
+except Exception:
+    _HAS_H2 = False
+
+
+# ---------- Erreurs ----------
+class UpstreamError(RuntimeError):
+    """Échec d'un essai ; `retryable` : un autre essai (ou backend) peut réussir."""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+class UpstreamUnavailable(UpstreamError):
+    """Aucun appel possible dans le budget : disjoncteur ouvert, saturation ou délai épuisé."""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message, retryable=False)
+        self.retry_after = retry_after
+
+
+# ---------- Disjoncteur ----------
+_CIRCUIT_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+class CircuitBreaker:
+    def __init__(self, name: str, failures: int = LLM_BREAKER_FAILURES, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.name = name
+        self.threshold = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        LLM_CIRCUIT_STATE.labels(backend=name).set(0)
+
+    def _set(self, state: str):
+        if state != self.state:
+            log.warning("llm backend %s circuit %s -> %s", self.name, self.state, state)
+            self.state = state
+            LLM_CIRCUIT_STATE.labels(backend=self.name).set(_CIRCUIT_VALUES[state])
+
+    def allow(self) -> bool:
+        """Peut-on appeler ? En demi-ouverture, une seule requête de test à la fois."""
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self._set("half_open")
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def retry_after(self) -> float:
+        return max(0.0, self.cooldown - (time.monotonic() - self.opened_at)) if self.state == "open" else 0.0
+
+    def success(self):
+        self.failures = 0
+        self._probing = False
+        self._set("closed")
+
+    def failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == "half_open" or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+            self._set("open")
+
+    def abandon(self):
+        # Essai annulé (client parti, hedge perdant) : ni succès ni échec
+        self._probing = False
+
+
+# ---------- Concurrence adaptative ----------
+class AimdLimiter:
+    """
+    Limite de requêtes simultanées vers un backend : +1/limite par succès (≈ +1 par
+    "fenêtre"), x`backoff` sur signal de saturation (au plus une fois par seconde).
+    """
+
+    def __init__(self, name: str, initial: int = LLM_CONCURRENCY, maximum: int = LLM_CONCURRENCY_MAX,
+                 minimum: int = 1, backoff: float = 0.5):
+        self.name = name
+        self.limit = float(min(initial, maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._last_drop = 0.0
+        LLM_CONCURRENCY_LIMIT.labels(backend=name).set(self.limit)
+
+    def has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit) and not self._waiters
+
+    async def acquire(self, timeout: float):
+        if self.has_capacity():
+            self.in_flight += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await asyncio.wait_for(fut, max(timeout, 0))
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if fut.done() and not fut.cancelled():
+                self.release("ignore")  # place attribuée au moment de l'abandon : on la rend
+            else:
+                try:
+                    self._waiters.remove(fut)
+                except ValueError:
+                    pass
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise UpstreamUnavailable(f"{self.name}: concurrency limit reached", retry_after=1.0)
+
+    def release(self, outcome: str):
+        """outcome : "ok" (augmente), "drop" (réduit), "ignore"."""
+        self.in_flight -= 1
+        if outcome == "ok":
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+        elif outcome == "drop":
+            now = time.monotonic()
+            if now - self._last_drop >= 1.0:
+                self._last_drop = now
+                self.limit = max(self.minimum, self.limit * self.backoff)
+        LLM_CONCURRENCY_LIMIT.labels(backend=self.name).set(self.limit)
+        while self._waiters and self.in_flight < int(self.limit):
+            fut = self._waiters.popleft()
+            if not fut.done():
+                self.in_flight += 1
+                fut.set_result(None)
+
+
+class LatencyWindow:
+    """Dernières latences réussies ; p95 recalculé tous les 10 ajouts."""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.samples: deque[float] = deque(maxlen=size)
+        self.min_samples = min_samples
+        self._p95: Optional[float] = None
+        self._stale = 0
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+        self._stale += 1
+        if self._stale >= 10:
+            self._stale = 0
+            self._p95 = None
+
+    def p95(self) -> Optional[float]:
+        if len(self.samples) < self.min_samples:
+            return None
+        if self._p95 is None:
+            ordered = sorted(self.samples)
+            self._p95 = ordered[int(0.95 * (len(ordered) - 1))]
+        return self._p95
+
+
+# ---------- Backends ----------
+class Backend:
+    """
+    Un modèle chez un fournisseur, via l'API chat-completions compatible OpenAI.
+    Un autre protocole : sous-classer et surcharger send() / stream_lines().
+    """
+
+    def __init__(self, provider: str, model: str, base_url: str, api_key: Optional[str]):
+        self.provider = provider
+        self.model = model
+        self.name = f"{provider}:{model}"
+        self.base_url = base_url.rstrip("/")
+        self.url = self.base_url + "/chat/completions"
+        self.api_key = api_key
+        self.breaker = CircuitBreaker(self.name)
+        self.limiter = AimdLimiter(self.name)
+        # Fenêtres séparées : le p95 du hedge porte sur des réponses complètes, pas sur le
+        # temps au premier token du streaming (bien plus court)
+        self.latency = LatencyWindow()
+        self.ttft = LatencyWindow()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Client httpx unique par backend et par worker : une poignée TLS, puis réutilisation."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=TIMEOUT,
+                http2=LLM_HTTP2 and _HAS_H2 and self.base_url.startswith("https"),
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_KEEPALIVE,
+                    keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+                ),
+                headers={"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"},
+            )
+        return self._client
+
+    def hedge_delay(self) -> Optional[float]:
+        p95 = self.latency.p95()
+        return None if p95 is None else max(LLM_HEDGE_MIN_DELAY, p95)
+
+    async def send(self, payload: dict, timeout: httpx.Timeout) -> httpx.Response:
+        return await self.client.post(self.url, json={**payload, "model": self.model}, timeout=timeout)
+
+    def stream_lines(self, payload: dict, timeout: httpx.Timeout):
+        return self.client.stream("POST", self.url, json={**payload, "model": self.model}, timeout=timeout)
+
+    async def warm_up(self, timeout: float = 3.0) -> str:
+        """Ouvre la connexion (DNS + TLS + HTTP/2) sans consommer de tokens."""
+        if not self.configured:
+            return f"skipped: {self.provider.upper()}_API_KEY missing"
+        try:
+            r = await self.client.get(self.base_url + "/models", timeout=timeout)
+            return f"ok ({r.status_code})"
+        except Exception as e:
+            return f"error: {e.__class__.__name__}"
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def backends_from_env() -> list[Backend]:
+    spec = LLM_BACKENDS or f"{PROVIDER}:{os.getenv(PROVIDER.upper() + '_MODEL') or DEFAULT_MODELS.get(PROVIDER, '')}"
+    backends = []
+    for entry in filter(None, (e.strip() for e in spec.split(","))):
+        provider, _, model = entry.partition(":")
+        prefix = provider.upper().replace("-", "_")
+        base_url = os.getenv(prefix + "_BASE_URL") or DEFAULT_BASE_URLS.get(provider)
+        model = model or os.getenv(prefix + "_MODEL") or DEFAULT_MODELS.get(provider, "")
+        if not base_url or not model:
+            log.error("llm backend %r ignored: set %s_BASE_URL and a model", entry, prefix)
+            continue
+        backends.append(Backend(provider, model, base_url, os.getenv(prefix + "_API_KEY")))
+    return backends
+
+
+# ---------- Orchestration ----------
+def _attempt_timeout(remaining: float) -> httpx.Timeout:
+    return httpx.Timeout(min(TIMEOUT.read, remaining), connect=min(TIMEOUT.connect, remaining))
+
+def _record_usage(backend: Backend, usage: Optional[dict]):
+    if not usage:
+        return
+    LLM_TOKENS.labels(provider=backend.provider, kind="prompt").inc(usage.get("prompt_tokens") or 0)
+    LLM_TOKENS.labels(provider=backend.provider, kind="completion").inc(usage.get("completion_tokens") or 0)
+
+def _status_error(backend: Backend, status: int) -> UpstreamError:
+    # 408/429/5xx : transitoire ; autre 4xx : requête ou config refusée par ce backend
+    retryable = status in (408, 429) or status >= 500
+    return UpstreamError(f"{backend.name}: upstream {status}", retryable=retryable)
+
+
+class Upstream:
+    def __init__(self, backends: list[Backend], retries: int = RETRIES, deadline: float = LLM_DEADLINE):
+        self.backends = backends
+        self.retries = retries
+        self.deadline = deadline
+
+    @property
+    def primary(self) -> Optional[Backend]:
+        return self.backends[0] if self.backends else None
+
+    def missing_config(self) -> Optional[str]:
+        """Message d'erreur si aucun backend n'est utilisable, sinon None."""
+        if not self.backends:
+            return "no LLM backend configured"
+        if not any(b.configured for b in self.backends):
+            return f"{self.primary.provider.upper()}_API_KEY missing"
+        return None
+
+    def _pick(self, attempt: int) -> Optional[Backend]:
+        """Rotation à partir de l'essai courant : essai 0 -> principal, puis basculement."""
+        n = len(self.backends)
+        for k in range(n):
+            backend = self.backends[(attempt + k) % n]
+            if backend.configured and backend.breaker.allow():
+                return backend
+        return None
+
+    def _unavailable(self) -> UpstreamUnavailable:
+        waits = [b.breaker.retry_after() for b in self.backends if b.configured]
+        return UpstreamUnavailable("all LLM backends unavailable (circuit open)", retry_after=max(1.0, min(waits or [1.0])))
+
+    async def _next_backend(self, attempt: int, previous: Optional[Backend], error: Optional[Exception],
+                            deadline: float) -> Backend:
+        """Backend de l'essai ; backoff seulement si l'on réessaie le même (basculement immédiat)."""
+        backend = self._pick(attempt)
+        if backend is None:
+            LLM_REJECTED.labels(backend="*", reason="circuit_open").inc()
+            raise self._unavailable()
+        if attempt:
+            LLM_RETRIES.labels(provider=backend.provider, reason=type(error).__name__).inc()
+            pause = min(0.5 * attempt, deadline - time.monotonic() - 0.1)
+            if backend is previous and pause > 0:
+                await asyncio.sleep(pause)
+        return backend
+
+    def _exhausted(self, deadline: float, error: Optional[Exception]) -> Exception:
+        if deadline - time.monotonic() <= 0:
+            LLM_REJECTED.labels(backend="*", reason="deadline").inc()
+            return UpstreamUnavailable(f"LLM deadline exceeded ({self.deadline:.0f}s)", retry_after=1.0)
+        return error
+
+    # ----- Non streaming -----
+    async def complete(self, payload: dict) -> tuple[dict, Backend]:
+        """Réponse JSON de chat-completions et backend qui l'a servie."""
+        deadline = time.monotonic() + self.deadline
+        backend: Optional[Backend] = None
+        last_err: Optional[Exception] = None
+        for i in range(self.retries + 1):
+            if deadline - time.monotonic() <= 0:
+                break
+            backend = await self._next_backend(i, backend, last_err, deadline)
+            try:
+                return await self._hedged(backend, payload, deadline)
+            except UpstreamError as e:
+                # Saturé, transitoire ou refusé par ce backend : essai suivant (ou autre backend)
+                last_err = e
+                if not e.retryable and len(self.backends) == 1 and not isinstance(e, UpstreamUnavailable):
+                    raise
+        raise self._exhausted(deadline, last_err)
+
+    async def _hedged(self, backend: Backend, payload: dict, deadline: float):
+        """Un essai ; si LLM_HEDGE et qu'il dépasse le p95 du backend, une copie part en parallèle."""
+        if not LLM_HEDGE:
+            return await self._attempt(backend, payload, deadline)
+        tasks = [asyncio.create_task(self._attempt(backend, payload, deadline))]
+        try:
+            delay = backend.hedge_delay()
+            if delay is not None and delay < deadline - time.monotonic():
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and backend.breaker.state == "closed" and backend.limiter.has_capacity():
+                    LLM_HEDGES.labels(backend=backend.name, outcome="fired").inc()
+                    tasks.append(asyncio.create_task(self._attempt(backend, payload, deadline)))
+            pending, err = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t.exception() is None:
+                        if t is not tasks[0]:
+                            LLM_HEDGES.labels(backend=backend.name, outcome="won").inc()
+                        return t.result()
+                    err = t.exception()
+            raise err
+        finally:
+            # Perdant (ou appelant annulé) : on libère la connexion et la place du limiteur
+            for t in tasks:
+                if not t.done():
+                    t.cancel()
+
+    async def _attempt(self, backend: Backend, payload: dict, deadline: float):
+        remaining = deadline - time.monotonic()
+        try:
+            await backend.limiter.acquire(remaining)
+        except UpstreamUnavailable:
+            LLM_REJECTED.labels(backend=backend.name, reason="overloaded").inc()
+            backend.breaker.abandon()
+            raise
+        outcome, status = "drop", "error"
+        start = time.perf_counter()
+        try:
+            r = await backend.send(payload, _attempt_timeout(deadline - time.monotonic()))
+            status = str(r.status_code)
+            if r.status_code >= 400:
+                err = _status_error(backend, r.status_code)
+                if err.retryable:
+                    backend.breaker.failure()
+                else:
+                    outcome = "ignore"
+                    backend.breaker.success()  # le backend répond : c'est la requête qui est refusée
+                raise err
+            data = r.json()
+            outcome = "ok"
+            backend.breaker.success()
+            backend.latency.add(time.perf_counter() - start)
+            _record_usage(backend, data.get("usage"))
+            return data, backend
+        except asyncio.CancelledError:
+            outcome = "ignore"
+            backend.breaker.abandon()
+            raise
+        except UpstreamError:
+            raise
+        except Exception as e:  # timeout, connexion, JSON invalide
+            backend.breaker.failure()
+            raise UpstreamError(f"{backend.name}: {e.__class__.__name__}") from e
+        finally:
+            backend.limiter.release(outcome)
+            LLM_LATENCY.labels(provider=backend.provider, status=status).observe(time.perf_counter() - start)
+
+    # ----- Streaming -----
+    async def stream(self, payload: dict) -> AsyncIterator[tuple[str, Backend]]:
+        """
+        Deltas de texte (SSE compatible OpenAI) et backend qui les produit. Le budget couvre
+        l'attente du premier token ; on ne réessaie (ni ne bascule) qu'avant celui-ci.
+        Pas de hedge en streaming : ce serait payer deux générations complètes.
+        """
+        deadline = time.monotonic() + self.deadline
+        backend: Optional[Backend] = None
+        last_err: Optional[Exception] = None
+        for i in range(self.retries + 1):
+            if deadline - time.monotonic() <= 0:
+                break
+            backend = await self._next_backend(i, backend, last_err, deadline)
+            sent = False
+            try:
+                # aclosing : si le client s'en va, la place du limiteur est rendue tout de suite
+                async with aclosing(self._stream_attempt(backend, payload, deadline)) as deltas:
+                    async for delta in deltas:
+                        sent = True
+                        yield delta, backend
+                return
+            except UpstreamError as e:
+                if sent or (not e.retryable and len(self.backends) == 1 and not isinstance(e, UpstreamUnavailable)):
+                    raise
+                last_err = e
+        raise self._exhausted(deadline, last_err)
+
+    async def _stream_attempt(self, backend: Backend, payload: dict, deadline: float) -> AsyncIterator[str]:
+        try:
+            await backend.limiter.acquire(deadline - time.monotonic())
+        except UpstreamUnavailable:
+            LLM_REJECTED.labels(backend=backend.name, reason="overloaded").inc()
+            backend.breaker.abandon()
+            raise
+        outcome, status = "drop", "error"
+        start = time.perf_counter()
+        try:
+            # Le délai restant borne les en-têtes et le premier token ; ensuite, timeout de lecture
+            timeout = httpx.Timeout(TIMEOUT.read, connect=min(TIMEOUT.connect, deadline - time.monotonic()))
+            async with AsyncExitStack() as stack:
+                async with asyncio.timeout(max(deadline - time.monotonic(), 0.001)):
+                    r = await stack.enter_async_context(backend.stream_lines(payload, timeout))
+                status = str(r.status_code)
+                if r.status_code >= 400:
+                    err = _status_error(backend, r.status_code)
+                    if err.retryable:
+                        backend.breaker.failure()
+                    else:
+                        outcome = "ignore"
+                        backend.breaker.success()
+                    raise err
+                lines = r.aiter_lines()
+                first = True
+                while True:
+                    if first:
+                        async with asyncio.timeout(max(deadline - time.monotonic(), 0.001)):
+                            line = await anext(lines)
+                    else:
+                        line = await anext(lines)
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    # Groq : usage dans x_groq sur le dernier chunk
+                    _record_usage(backend, chunk.get("usage") or (chunk.get("x_groq") or {}).get("usage"))
+                    choices = chunk.get("choices") or []
+                    delta = (choices[0].get("delta") or {}).get("content") if choices else None
+                    if delta:
+                        if first:
+                            first = False
+                            backend.ttft.add(time.perf_counter() - start)  # temps au premier token
+                        yield delta
+            outcome = "ok"
+            backend.breaker.success()
+        except (asyncio.CancelledError, GeneratorExit):
+            outcome = "ignore"
+            backend.breaker.abandon()
+            raise
+        except StopAsyncIteration:
+            outcome = "ok"
+            backend.breaker.success()
+        except UpstreamError:
+            raise
+        except Exception as e:
+            backend.breaker.failure()
+            raise UpstreamError(f"{backend.name}: {e.__class__.__name__}") from e
+        finally:
+            backend.limiter.release(outcome)
+            LLM_LATENCY.labels(provider=backend.provider, status=status).observe(time.perf_counter() - start)
+
+    async def warm_up(self) -> str:
+        return await self.primary.warm_up() if self.primary else "skipped: no backend"
+
+    async def aclose(self):
+        for b in self.backends:
+            await b.aclose()
+
+
+upstream = Upstream(backends_from_env())
@@ -0,0 +1,133 @@
+"""
+Faux fournisseur LLM (chat-completions compatible OpenAI/Groq), pour tester et mesurer
+l'API sans réseau ni tokens facturés.
+
+    cd api && python -m bench.fake_upstream --port 8900 --latency 300 --jitter 100 --error-rate 0.05
+
+puis lancer l'API avec :
+
+    GROQ_BASE_URL=http://127.0.0.1:8900/openai/v1 GROQ_API_KEY=fake uvicorn app.main:app
+
+Latence = latency ± jitter (ms), plus une queue lente optionnelle (--slow-rate / --slow-ms).
+--error-rate renvoie --error-status ; le streaming (SSE) découpe la réponse en --chunks
+morceaux espacés de --token-ms. GET /stats : compteurs (requêtes, erreurs, en cours, pic).
+"""
+import json, random, asyncio, argparse
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+ANSWER = {
+    "score": 72,
+    "forces": ["Python / FastAPI en production", "Déploiement Docker et Kubernetes"],
+    "manques": ["Terraform", "AWS"],
+    "reco": "Mettre en avant les projets d'infrastructure et ajouter une certification cloud.",
+    "mots_cles": ["python", "fastapi", "docker", "kubernetes", "postgresql"],
+}
+
+
+class FakeUpstream:
+    def __init__(self, latency_ms=300.0, jitter_ms=100.0, error_rate=0.0, error_status=503,
+                 slow_rate=0.0, slow_ms=5000.0, chunks=12, token_ms=20.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.chunks = chunks
+        self.token_ms = token_ms
+        self.rng = random.Random(seed)
+        self.stats = {"requests": 0, "errors": 0, "streams": 0, "in_flight": 0, "peak_in_flight": 0}
+
+    def _delay(self) -> float:
+        ms = self.latency_ms + self.rng.uniform(-self.jitter_ms, self.jitter_ms)
+        if self.slow_rate and self.rng.random() < self.slow_rate:
+            ms = self.slow_ms
+        return max(ms, 0.0) / 1000
+
+    async def completions(self, request: Request):
+        body = await request.json()
+        self.stats["requests"] += 1
+        self.stats["in_flight"] += 1
+        self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.stats["in_flight"])
+        try:
+            await asyncio.sleep(self._delay())
+            if self.error_rate and self.rng.random() < self.error_rate:
+                self.stats["errors"] += 1
+                return JSONResponse({"error": {"message": "fake upstream error"}}, status_code=self.error_status)
+        finally:
+            self.stats["in_flight"] -= 1
+
+        content = json.dumps(ANSWER, ensure_ascii=False)
+        usage = {"prompt_tokens": len(json.dumps(body)) // 4, "completion_tokens": len(content) // 4}
+        model = body.get("model", "fake")
+        if not body.get("stream"):
+            return JSONResponse({
+                "id": "fake", "object": "chat.completion", "model": model, "usage": usage,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            })
+
+        self.stats["streams"] += 1
+        step = max(1, -(-len(content) // max(1, self.chunks)))
+
+        async def events():
+            for i in range(0, len(content), step):
+                chunk = {"id": "fake", "model": model, "choices": [{"index": 0, "delta": {"content": content[i:i + step]}}]}
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                await asyncio.sleep(self.token_ms / 1000)
+            last = {"id": "fake", "model": model, "choices": [], "x_groq": {"usage": usage}}
+            yield f"data: {json.dumps(last)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def models(self, request: Request):
+        return JSONResponse({"object": "list", "data": [{"id": "fake", "object": "model"}]})
+
+    async def get_stats(self, request: Request):
+        return JSONResponse(self.stats)
+
+    def app(self) -> Starlette:
+        return Starlette(routes=[
+            Route("/openai/v1/chat/completions", self.completions, methods=["POST"]),
+            Route("/v1/chat/completions", self.completions, methods=["POST"]),
+            Route("/openai/v1/models", self.models),
+            Route("/v1/models", self.models),
+            Route("/stats", self.get_stats),
+        ])
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", type=float, default=300.0, help="latence moyenne (ms)")
+    parser.add_argument("--jitter", type=float, default=100.0, help="± ms, uniforme")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="part des requêtes très lentes")
+    parser.add_argument("--slow-ms", type=float, default=5000.0)
+    parser.add_argument("--chunks", type=int, default=12, help="morceaux SSE par réponse")
+    parser.add_argument("--token-ms", type=float, default=20.0, help="délai entre morceaux SSE (ms)")
+    parser.add_argument("--seed", type=int, default=None)
+
+def from_args(args) -> FakeUpstream:
+    return FakeUpstream(
+        latency_ms=args.latency, jitter_ms=args.jitter, error_rate=args.error_rate,
+        error_status=args.error_status, slow_rate=args.slow_rate, slow_ms=args.slow_ms,
+        chunks=args.chunks, token_ms=args.token_ms, seed=args.seed,
+    )
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(from_args(args).app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,510 @@
+"""
+Test de charge : lance l'API (uvicorn app.main:app) contre le faux fournisseur LLM
+(bench/fake_upstream.py), puis fait monter la concurrence sur chaque endpoint.
+
+    cd api && python -m bench.loadtest --concurrency 1,8,32,64 --duration 10 --latency 300
+    cd api && python -m bench.loadtest --scenarios analyze,ingest_pdf --compare bench/results/avant.json
+
+Chaque palier est en boucle fermée (C clients qui renvoient une requête dès la réponse) et
+mesure : débit, p50/p95/p99 (et time-to-first-byte en streaming), codes d'erreur, lag de
+l'event loop de l'API (histogramme cvagent_event_loop_lag_seconds de /metrics) et RSS de
+l'arbre de process serveur (workers uvicorn + pool PDF, lu dans /proc). Les entrées sont
+uniques par requête (cache et store de documents contournés) sauf --reuse.
+Résultats en JSON (--output) ; --compare signale les régressions (code de sortie 1).
+"""
+import os, sys, json, time, random, asyncio, argparse, platform, tempfile, subprocess
+from datetime import datetime, timezone
+from typing import Optional
+
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+
+from . import fake_upstream
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.dirname(HERE)
+LAG_METRIC = "cvagent_event_loop_lag_seconds"
+
+# Derrière un proxy TLS (comme en prod) : évite la redirection HTTPS de l'app
+HEADERS = {"X-Forwarded-Proto": "https"}
+
+
+# ---------- Données générées ----------
+SKILLS = [
+    "Python", "FastAPI", "Django", "PostgreSQL", "Docker", "Kubernetes", "Terraform", "AWS",
+    "GCP", "React", "TypeScript", "Kafka", "Redis", "Airflow", "Spark", "CI/CD", "Linux", "Go",
+]
+VERBS = ["Conception", "Migration", "Industrialisation", "Optimisation", "Mise en place", "Refonte"]
+OBJECTS = ["d'une API de paiement", "du pipeline de données", "de la plateforme de recherche",
+           "du monitoring", "des déploiements", "d'un service de recommandation"]
+
+def resume_text(rng: random.Random, nonce: str, entries: int = 12) -> str:
+    lines = [f"Candidat {nonce}", "Ingénieur logiciel", "", "EXPÉRIENCE"]
+    for year in range(2024, 2024 - entries, -1):
+        lines.append(f"{year} - {rng.choice(VERBS)} {rng.choice(OBJECTS)} ({', '.join(rng.sample(SKILLS, 3))})")
+        lines.append(f"Réduction de la latence de {rng.randint(10, 80)} %, équipe de {rng.randint(2, 12)} personnes.")
+    lines += ["", "COMPÉTENCES", ", ".join(rng.sample(SKILLS, 8))]
+    return "\n".join(lines)
+
+def job_text(rng: random.Random) -> str:
+    return (f"Nous recherchons un ingénieur backend senior. Stack : {', '.join(rng.sample(SKILLS, 6))}. "
+            f"Expérience de la production et de l'astreinte ; {rng.randint(3, 8)} ans minimum.")
+
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def make_pdf(pages: int, seed: str) -> bytes:
+    """PDF texte multi-pages minimal (Helvetica, WinAnsi), sans dépendance."""
+    rng = random.Random(seed)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    kids = []
+    for page in range(pages):
+        lines = [f"Page {page + 1} - {seed}"] + resume_text(rng, seed, entries=20).splitlines()
+        ops = ["BT", "/F1 10 Tf", "14 TL", "50 800 Td"] + [f"({_pdf_escape(l)}) Tj T*" for l in lines[:52]] + ["ET"]
+        stream = "\n".join(ops).encode("cp1252", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), pages)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+# ---------- Scénarios ----------
+class Scenarios:
+    """Une requête par appel : -> (status, ok, time-to-first-byte ou None)."""
+
+    def __init__(self, pdf_pages: int, reuse: bool):
+        self.pdf_pages = pdf_pages
+        self.reuse = reuse
+        self.run_id = os.urandom(4).hex()
+        self._pdfs: dict[str, bytes] = {}
+
+    def _nonce(self, i: int) -> str:
+        return f"{self.run_id}-0" if self.reuse else f"{self.run_id}-{i}"
+
+    def _analyze_payload(self, i: int) -> dict:
+        nonce = self._nonce(i)
+        rng = random.Random(nonce)
+        return {"resume": resume_text(rng, nonce), "job": job_text(rng), "language": "fr"}
+
+    def _pdf(self, i: int) -> bytes:
+        if self.reuse:
+            nonce = self._nonce(0)
+            if nonce not in self._pdfs:
+                self._pdfs[nonce] = make_pdf(self.pdf_pages, nonce)
+            return self._pdfs[nonce]
+        return make_pdf(self.pdf_pages, self._nonce(i))
+
+    async def analyze(self, client: httpx.AsyncClient, i: int):
+        r = await client.post("/analyze-text", json=self._analyze_payload(i))
+        return r.status_code, r.status_code == 200 and r.json().get("ok") is not False, None
+
+    async def analyze_stream(self, client: httpx.AsyncClient, i: int):
+        start, ttfb, body = time.perf_counter(), None, []
+        async with client.stream("POST", "/analyze-text/stream", json=self._analyze_payload(i)) as r:
+            async for chunk in r.aiter_text():
+                if ttfb is None:
+                    ttfb = time.perf_counter() - start
+                body.append(chunk)
+        text = "".join(body)
+        return r.status_code, r.status_code == 200 and "event: error" not in text, ttfb
+
+    async def prescore(self, client: httpx.AsyncClient, i: int):
+        r = await client.post("/analyze-text", json={**self._analyze_payload(i), "llm": False})
+        return r.status_code, r.status_code == 200, None
+
+    async def ingest_pdf(self, client: httpx.AsyncClient, i: int):
+        pdf = await asyncio.to_thread(self._pdf, i)
+        r = await client.post("/ingest/pdf", files={"file": ("cv.pdf", pdf, "application/pdf")})
+        return r.status_code, r.status_code == 200, None
+
+    async def upload(self, client: httpx.AsyncClient, i: int):
+        pdf = await asyncio.to_thread(self._pdf, i)
+        r = await client.post("/resume/upload", files={"file": ("cv.pdf", pdf, "application/pdf")})
+        return r.status_code, r.status_code == 200, None
+
+    async def export_pdf(self, client: httpx.AsyncClient, i: int):
+        r = await client.post("/export/pdf", json={"title": "Lettre", "text": resume_text(random.Random(i), str(i))})
+        return r.status_code, r.status_code == 200, None
+
+    async def export_docx(self, client: httpx.AsyncClient, i: int):
+        r = await client.post("/export/docx", json={
+            "title": "CV", "headline": "Ingénieur backend", "bullets": VERBS, "skills": SKILLS, "about": "Profil.",
+        })
+        return r.status_code, r.status_code == 200, None
+
+    async def linkedin_pdf(self, client: httpx.AsyncClient, i: int):
+        r = await client.post("/linkedin/export/pdf", json={"headline": "Ingénieur backend", "about": job_text(random.Random(i))})
+        return r.status_code, r.status_code == 200, None
+
+SCENARIOS = ["analyze", "analyze_stream", "prescore", "ingest_pdf", "upload", "export_pdf", "export_docx", "linkedin_pdf"]
+
+
+# ---------- Mesures ----------
+def percentile(sorted_values: list[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+def latency_summary(values: list[float]) -> dict:
+    values = sorted(values)
+    return {
+        "p50_ms": _ms(percentile(values, 0.50)), "p95_ms": _ms(percentile(values, 0.95)),
+        "p99_ms": _ms(percentile(values, 0.99)), "max_ms": _ms(values[-1] if values else None),
+    }
+
+def lag_buckets(metrics_text: str) -> tuple[list[tuple[float, float]], float, float]:
+    """Histogramme cumulé du lag (somme des workers) -> ([(le, count)], somme, nombre)."""
+    buckets: dict[float, float] = {}
+    total = count = 0.0
+    for family in text_string_to_metric_families(metrics_text):
+        if family.name != LAG_METRIC:
+            continue
+        for sample in family.samples:
+            if sample.name.endswith("_bucket"):
+                le = float(sample.labels["le"])
+                buckets[le] = buckets.get(le, 0.0) + sample.value
+            elif sample.name.endswith("_sum"):
+                total += sample.value
+            elif sample.name.endswith("_count"):
+                count += sample.value
+    return sorted(buckets.items()), total, count
+
+def lag_summary(before, after) -> dict:
+    """Lag de l'event loop pendant le palier : différence des deux scrapes, quantiles interpolés."""
+    if not after[0]:
+        return {"samples": 0}
+    prev = dict(before[0])
+    buckets = [(le, n - prev.get(le, 0.0)) for le, n in after[0]]
+    count = after[2] - before[2]
+    if count <= 0:
+        return {"samples": 0}
+
+    def quantile(q: float) -> float:
+        rank, lower, below = q * count, 0.0, 0.0
+        for le, n in buckets:
+            if n >= rank:
+                if le == float("inf"):
+                    return lower
+                return lower + (le - lower) * ((rank - below) / (n - below) if n > below else 0.0)
+            lower, below = le, n
+        return lower
+
+    # Borne haute du pire échantillon (None : au-delà du dernier bucket)
+    worst = next((le for le, n in buckets if n >= count), None)
+    return {
+        "samples": int(count), "mean_ms": _ms((after[1] - before[1]) / count), "p99_ms": _ms(quantile(0.99)),
+        "max_le_ms": _ms(worst) if worst not in (None, float("inf")) else None,
+    }
+
+def _proc_tree(root: int) -> list[int]:
+    children: dict[int, list[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        children.setdefault(ppid, []).append(int(entry))
+    tree, todo = [], [root]
+    while todo:
+        pid = todo.pop()
+        tree.append(pid)
+        todo.extend(children.get(pid, []))
+    return tree
+
+def _status_kb(pid: int, field: str) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+def memory(root: int) -> dict:
+    """RSS (Mo) de l'arbre de process serveur ; pic (VmHWM) du plus gros process."""
+    if not os.path.isdir("/proc"):
+        return {}
+    pids = _proc_tree(root)
+    rss = [_status_kb(pid, "VmRSS") for pid in pids]
+    return {
+        "processes": len(pids),
+        "rss_mb": round(sum(rss) / 1024, 1),
+        "rss_max_process_mb": round(max(rss, default=0) / 1024, 1),
+        "peak_max_process_mb": round(max((_status_kb(pid, "VmHWM") for pid in pids), default=0) / 1024, 1),
+    }
+
+async def client_lag(stop: asyncio.Event, samples: list[float], interval: float = 0.05):
+    """Lag de la boucle du générateur : s'il monte, c'est le client qui sature, pas l'API."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(loop.time() - start - interval)
+
+
+# ---------- Pilote ----------
+async def run_step(client: httpx.AsyncClient, server_pid: int, fake_url: str, name: str, call,
+                   concurrency: int, duration: float, warmup: float, counter: list[int]) -> dict:
+    loop = asyncio.get_running_loop()
+    t0 = loop.time()
+    measure_from, stop_at = t0 + warmup, t0 + warmup + duration
+    calls: list[tuple[float, float, object, bool, Optional[float]]] = []  # début, fin, statut, succès, ttfb
+    stop = asyncio.Event()
+    gen_lag: list[float] = []
+
+    async def worker():
+        while loop.time() < stop_at:
+            counter[0] += 1
+            i = counter[0]
+            start = loop.time()
+            try:
+                status, success, ttfb = await call(client, i)
+            except httpx.HTTPError as e:
+                status, success, ttfb = type(e).__name__, False, None
+            calls.append((start, loop.time(), status, success, ttfb))
+
+    async def scrape() -> str:
+        return (await client.get("/metrics")).text
+
+    async def upstream_requests() -> int:
+        async with httpx.AsyncClient() as fake:
+            return (await fake.get(f"{fake_url}/stats")).json()["requests"]
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    probe = asyncio.create_task(client_lag(stop, gen_lag))
+    await asyncio.sleep(max(0.0, measure_from - loop.time()))
+    # Fenêtre mesurée entre les relevés (/metrics, /stats), qui restent en dehors : sous
+    # charge ils prennent du temps, et le débit serait surestimé s'ils l'amputaient
+    before, upstream_before = lag_buckets(await scrape()), await upstream_requests()
+    window_start = loop.time()
+    await asyncio.sleep(max(0.0, stop_at - loop.time()))
+    window_end = loop.time()
+    after, upstream_after = lag_buckets(await scrape()), await upstream_requests()
+    mem = memory(server_pid)
+    await asyncio.gather(*workers)
+    stop.set()
+    await probe
+    elapsed = max(window_end - window_start, 1e-9)
+
+    # Requêtes terminées dans la fenêtre : mêmes bornes pour le débit et les compteurs amont
+    latencies, ttfbs, statuses, errors = [], [], {}, {}
+    ok = 0
+    for start, end, status, success, ttfb in calls:
+        if not window_start <= end <= window_end:
+            continue
+        latencies.append(end - start)
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        if success:
+            ok += 1
+        else:
+            errors[str(status)] = errors.get(str(status), 0) + 1
+        if ttfb is not None:
+            ttfbs.append(ttfb)
+
+    row = {
+        "scenario": name, "concurrency": concurrency, "requests": len(latencies), "ok": ok,
+        "rps": round(ok / elapsed, 2), "statuses": statuses, "errors": errors,
+        "latency": latency_summary(latencies),
+        "loop_lag": lag_summary(before, after),
+        "client_loop_lag_max_ms": _ms(max(gen_lag, default=0.0)),
+        "upstream_requests": upstream_after - upstream_before,
+        "memory": mem,
+    }
+    if ttfbs:
+        row["ttfb"] = latency_summary(ttfbs)
+    return row
+
+def print_row(row: dict):
+    lat, lag, mem = row["latency"], row["loop_lag"], row["memory"]
+    errors = ",".join(f"{k}x{v}" for k, v in row["errors"].items()) or "-"
+    print(f"{row['scenario']:<15}c={row['concurrency']:<4} {row['rps']:>8.1f} req/s  "
+          f"p50 {lat['p50_ms'] or 0:>8.1f}  p95 {lat['p95_ms'] or 0:>8.1f}  p99 {lat['p99_ms'] or 0:>8.1f} ms  "
+          f"lag p99 {lag.get('p99_ms') or 0:>6.1f} ms  rss {mem.get('rss_mb', 0):>7.1f} Mo  err {errors}", flush=True)
+
+
+# ---------- Serveurs ----------
+def _free_port() -> int:
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _wait_http(url: str, timeout: float, proc: subprocess.Popen):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"{url}: le process s'est arrêté (code {proc.returncode})")
+        try:
+            if httpx.get(url, headers=HEADERS, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise SystemExit(f"{url}: pas prêt après {timeout:.0f}s")
+
+def fake_command(args, port: int) -> list[str]:
+    return [
+        sys.executable, "-m", "bench.fake_upstream", "--port", str(port),
+        "--latency", str(args.latency), "--jitter", str(args.jitter),
+        "--error-rate", str(args.error_rate), "--error-status", str(args.error_status),
+        "--slow-rate", str(args.slow_rate), "--slow-ms", str(args.slow_ms),
+        "--chunks", str(args.chunks), "--token-ms", str(args.token_ms),
+        *(["--seed", str(args.seed)] if args.seed is not None else []),
+    ]
+
+def api_env(args, fake_url: str, tmp: str) -> dict:
+    env = dict(os.environ)
+    for key in ("LLM_BACKENDS", "CACHE_DB"):
+        env.pop(key, None)
+    env.update({
+        "PROVIDER": "groq", "GROQ_API_KEY": "fake", "GROQ_BASE_URL": f"{fake_url}/openai/v1",
+        "RATE_LIMIT_SCALE": "1000000", "RATE_LIMIT_FILE": os.path.join(tmp, "ratelimit.bin"),
+        "JOBS_DB": os.path.join(tmp, "jobs.sqlite"), "DOCS_DB": os.path.join(tmp, "docs.sqlite"),
+        "TRUSTED_HOSTS": "localhost,127.0.0.1",
+    })
+    if args.workers > 1:
+        os.makedirs(os.path.join(tmp, "metrics"))
+        env["PROMETHEUS_MULTIPROC_DIR"] = os.path.join(tmp, "metrics")
+    env.update(dict(kv.split("=", 1) for kv in args.env))
+    return env
+
+def _stop(proc: Optional[subprocess.Popen]):
+    if proc is None or proc.poll() is not None:
+        return
+    proc.terminate()
+    try:
+        proc.wait(10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+# ---------- Comparaison ----------
+def compare(previous: dict, current: dict, threshold: float) -> list[str]:
+    """Régressions par (scénario, concurrence) : débit en baisse ou p95 en hausse au-delà du seuil."""
+    old = {(r["scenario"], r["concurrency"]): r for r in previous.get("results", [])}
+    regressions = []
+    print(f"\nComparaison avec {previous.get('meta', {}).get('started_at', '?')} (seuil {threshold:.0%})")
+    for row in current["results"]:
+        ref = old.get((row["scenario"], row["concurrency"]))
+        if ref is None or not ref["ok"] or not row["ok"]:
+            continue
+        rps = row["rps"] / ref["rps"] - 1 if ref["rps"] else 0.0
+        p95_old, p95_new = ref["latency"]["p95_ms"], row["latency"]["p95_ms"]
+        p95 = p95_new / p95_old - 1 if p95_old else 0.0
+        flag = rps < -threshold or p95 > threshold
+        label = f"{row['scenario']} c={row['concurrency']}"
+        print(f"  {label:<22} débit {rps:+7.1%}  p95 {p95:+7.1%}{'  <- RÉGRESSION' if flag else ''}")
+        if flag:
+            regressions.append(label)
+    return regressions
+
+
+async def sweep(args, base_url: str, fake_url: str, server_pid: int) -> list[dict]:
+    scenarios = Scenarios(args.pdf_pages, args.reuse)
+    levels = [int(c) for c in args.concurrency.split(",")]
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    timeout = httpx.Timeout(args.timeout, connect=5.0)
+    results, counter = [], [0]
+    async with httpx.AsyncClient(base_url=base_url, headers=HEADERS, limits=limits, timeout=timeout) as client:
+        for name in args.scenarios.split(","):
+            call = getattr(scenarios, name)
+            for concurrency in levels:
+                row = await run_step(client, server_pid, fake_url, name, call, concurrency,
+                                     args.duration, args.warmup, counter)
+                print_row(row)
+                results.append(row)
+                if row["requests"] and row["statuses"].keys() == {"501"}:
+                    # Capacité absente de cet arbre (module optionnel) : inutile de monter en charge
+                    print(f"{name:<15}indisponible (501), paliers suivants ignorés", flush=True)
+                    break
+    return results
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"parmi {','.join(SCENARIOS)}")
+    ap.add_argument("--concurrency", default="1,8,32,64", help="paliers de clients simultanés")
+    ap.add_argument("--duration", type=float, default=10.0, help="secondes mesurées par palier")
+    ap.add_argument("--warmup", type=float, default=1.0, help="secondes ignorées en début de palier")
+    ap.add_argument("--timeout", type=float, default=60.0, help="timeout client par requête (s)")
+    ap.add_argument("--pdf-pages", type=int, default=10)
+    ap.add_argument("--reuse", action="store_true", help="mêmes entrées à chaque requête (chemin du cache)")
+    ap.add_argument("--workers", type=int, default=1, help="workers uvicorn")
+    ap.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="variable passée à l'API")
+    ap.add_argument("--output", default=None, help="JSON (défaut : bench/results/loadtest-<date>.json)")
+    ap.add_argument("--compare", default=None, help="JSON d'un run précédent")
+    ap.add_argument("--threshold", type=float, default=0.10, help="écart toléré avant régression")
+    fake_upstream.add_arguments(ap)
+    args = ap.parse_args()
+    unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+    if unknown:
+        ap.error(f"scénarios inconnus : {', '.join(sorted(unknown))}")
+
+    started_at = datetime.now(timezone.utc)
+    fake_port, api_port = _free_port(), _free_port()
+    fake_url, base_url = f"http://127.0.0.1:{fake_port}", f"http://127.0.0.1:{api_port}"
+    fake = api = None
+    with tempfile.TemporaryDirectory(prefix="cvagent-bench-") as tmp:
+        try:
+            fake = subprocess.Popen(fake_command(args, fake_port), cwd=API_DIR)
+            _wait_http(f"{fake_url}/stats", 15, fake)
+            api = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(api_port),
+                 "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"],
+                cwd=API_DIR, env=api_env(args, fake_url, tmp),
+            )
+            _wait_http(f"{base_url}/ready", 60, api)
+            results = asyncio.run(sweep(args, base_url, fake_url, api.pid))
+        finally:
+            _stop(api)
+            _stop(fake)
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=API_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    report = {
+        "meta": {
+            "started_at": started_at.isoformat(timespec="seconds"), "commit": commit,
+            "python": platform.python_version(), "cpus": os.cpu_count(), "args": vars(args),
+        },
+        "results": results,
+    }
+    output = args.output or os.path.join(HERE, "results", f"loadtest-{started_at:%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nRésultats : {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
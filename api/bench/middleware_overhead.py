@@ -0,0 +1,140 @@
+"""
+Micro-benchmark : coût par requête de la pile de middlewares, avant/après passage en ASGI pur.
+
+    cd api && python -m bench.middleware_overhead [--requests 20000]
+
+"Avant" reproduit les anciens middlewares (BaseHTTPMiddleware / @app.middleware("http")),
+"après" utilise ceux de l'app. Les deux piles entourent la même route triviale et sont
+appelées directement en ASGI (pas de réseau), pour isoler l'overhead des middlewares.
+"""
+import os, sys, time, json, asyncio, argparse, tempfile
+
+# Limites très hautes : on mesure l'overhead, pas les refus
+os.environ.setdefault("RATE_LIMIT_DEFAULT", "1000000000/second")
+os.environ.setdefault("RATE_LIMIT_FILE", os.path.join(tempfile.gettempdir(), "cvagent-bench-ratelimit.bin"))
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from app.limits import RateLimitMiddleware, MaxBodySizeMiddleware, rate_limiter, too_many_requests
+from app.security import SecurityHeadersMiddleware, _SECURITY_HEADERS
+from app.metrics import MetricsMiddleware, REQUEST_COUNT, REQUEST_LATENCY
+
+
+# ---------- Ancienne pile (référence) ----------
+class LegacySecurityHeaders(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        resp = await call_next(request)
+        for k, v in _SECURITY_HEADERS:
+            resp.headers.setdefault(k.decode(), v.decode())
+        return resp
+
+class LegacyMaxBodySize(BaseHTTPMiddleware):
+    max_bytes = 8 * 1024 * 1024
+
+    async def dispatch(self, request, call_next):
+        cl = request.headers.get("content-length")
+        if cl and cl.isdigit() and int(cl) > self.max_bytes:
+            return JSONResponse({"detail": "Payload too large"}, status_code=413)
+        return await call_next(request)
+
+async def legacy_rate_limit(request: Request, call_next):
+    retry_after = rate_limiter.check(request.url.path, request.client.host if request.client else "127.0.0.1")
+    if retry_after:
+        return too_many_requests(retry_after)
+    return await call_next(request)
+
+async def legacy_metrics(request: Request, call_next):
+    route = request.url.path
+    with REQUEST_LATENCY.labels(route=route).time():
+        resp = await call_next(request)
+    REQUEST_COUNT.labels(route=route, method=request.method, status=resp.status_code).inc()
+    return resp
+
+
+# ---------- Routes communes ----------
+async def json_route(request):
+    return JSONResponse({"pong": True})
+
+async def stream_route(request):
+    async def chunks():
+        for i in range(10):
+            yield b"x" * 64
+    return StreamingResponse(chunks(), media_type="text/plain")
+
+ROUTES = [Route("/bench/json", json_route), Route("/bench/stream", stream_route)]
+
+def build_before():
+    return Starlette(routes=ROUTES, middleware=[
+        Middleware(BaseHTTPMiddleware, dispatch=legacy_metrics),
+        Middleware(BaseHTTPMiddleware, dispatch=legacy_rate_limit),
+        Middleware(LegacyMaxBodySize),
+        Middleware(LegacySecurityHeaders),
+    ])
+
+def build_after():
+    return Starlette(routes=ROUTES, middleware=[
+        Middleware(MetricsMiddleware, routes=ROUTES),
+        Middleware(RateLimitMiddleware),
+        Middleware(MaxBodySizeMiddleware),
+        Middleware(SecurityHeadersMiddleware),
+    ])
+
+def build_bare():
+    return Starlette(routes=ROUTES)
+
+
+# ---------- Pilote ASGI ----------
+def make_scope(path: str) -> dict:
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "root_path": "", "query_string": b"", "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 12345), "server": ("bench", 80),
+    }
+
+def make_receive():
+    # Corps vide, puis attente (comme un client connecté) : les listeners de
+    # déconnexion de Starlette sont annulés en fin de réponse.
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.Event().wait()
+
+    return receive
+
+async def run(app, path: str, n: int) -> float:
+    async def send(message):
+        pass
+
+    scope = make_scope(path)
+    for _ in range(min(500, n)):  # warm-up
+        await app(dict(scope), make_receive(), send)
+    start = time.perf_counter()
+    for _ in range(n):
+        await app(dict(scope), make_receive(), send)
+    return (time.perf_counter() - start) / n * 1e6  # µs / requête
+
+async def main(n: int):
+    apps = {"bare": build_bare(), "before": build_before(), "after": build_after()}
+    results = {}
+    for path in ("/bench/json", "/bench/stream"):
+        row = {name: round(await run(app, path, n), 2) for name, app in apps.items()}
+        row["overhead_before_us"] = round(row["before"] - row["bare"], 2)
+        row["overhead_after_us"] = round(row["after"] - row["bare"], 2)
+        results[path] = row
+    print(json.dumps({"requests": n, "us_per_request": results}, indent=2))
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--requests", type=int, default=20000)
+    args = ap.parse_args()
+    sys.exit(asyncio.run(main(args.requests)))
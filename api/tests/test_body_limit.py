@@ -0,0 +1,72 @@
+"""MaxBodySizeMiddleware : refus sur Content-Length, et 413 en cours de lecture d'un corps chunked."""
+import asyncio
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from app.limits import MaxBodySizeMiddleware
+
+LIMIT = 1000
+
+
+async def echo(request: Request):
+    body = await request.body()
+    return JSONResponse({"size": len(body)})
+
+def _middleware() -> MaxBodySizeMiddleware:
+    mw = MaxBodySizeMiddleware(Starlette(routes=[Route("/upload", echo, methods=["POST"])]))
+    mw.max_bytes = LIMIT
+    return mw
+
+def call(chunks: list[bytes], content_length: int = None) -> tuple[int, str, int]:
+    """Requête ASGI brute -> (statut, corps, nombre de morceaux lus par l'app)."""
+    headers = [(b"content-type", b"application/octet-stream")]
+    if content_length is not None:
+        headers.append((b"content-length", str(content_length).encode()))
+    else:
+        headers.append((b"transfer-encoding", b"chunked"))
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/upload", "raw_path": b"/upload", "query_string": b"",
+        "headers": headers, "client": ("127.0.0.1", 1234), "server": ("testserver", 80),
+    }
+    pending = list(chunks)
+    reads = 0
+    sent = []
+
+    async def receive():
+        nonlocal reads
+        if not pending:
+            return {"type": "http.disconnect"}
+        reads += 1
+        body = pending.pop(0)
+        return {"type": "http.request", "body": body, "more_body": bool(pending)}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(_middleware()(scope, receive, send))
+    status = next(m["status"] for m in sent if m["type"] == "http.response.start")
+    body = b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+    return status, body.decode(), reads
+
+
+def test_chunked_body_under_limit_passes():
+    status, body, _ = call([b"x" * 400, b"x" * 400, b"x" * 200])
+    assert status == 200 and body == '{"size":1000}'
+
+def test_chunked_body_over_limit_is_cut_short():
+    chunks = [b"x" * 400] * 10
+    status, body, reads = call(chunks)
+    assert status == 413 and "too large" in body
+    assert reads == 3  # arrêt au morceau qui dépasse, la suite n'est pas lue
+
+def test_declared_length_over_limit_is_refused_before_reading():
+    status, _, reads = call([b"x" * 10], content_length=LIMIT + 1)
+    assert status == 413 and reads == 0
+
+def test_body_larger_than_declared_length_is_still_counted():
+    status, _, _ = call([b"x" * 600, b"x" * 600], content_length=10)
+    assert status == 413
@@ -0,0 +1,43 @@
+"""Compaction du prompt (app/compact.py) : budget respecté, jamais de CV vide."""
+from app.compact import compact_inputs, compact_resume, estimate_tokens, normalize, truncate_tokens
+
+WORDS = "python fastapi docker kubernetes projet équipe client données api gestion".split()
+
+def _long_line(n: int) -> str:
+    return " ".join(WORDS[i % len(WORDS)] + ("." if i % 23 == 22 else "") for i in range(n))
+
+
+def test_single_long_line_is_cut_not_dropped():
+    resume = _long_line(12000)
+    assert "\n" not in resume and estimate_tokens(resume) > 3000
+
+    compacted, job, tokens = compact_inputs(resume, "python docker", resume_budget=3000)
+    assert compacted
+    assert tokens["after"] - estimate_tokens(job) <= 3000
+    assert estimate_tokens(compacted) > 2500  # le budget est rempli, pas juste l'en-tête
+
+def test_header_kept_with_long_paragraph():
+    resume = "Jean Dupont\njean.dupont@example.com\n\n" + _long_line(8000)
+    compacted = compact_resume(resume, "kubernetes", budget=1000)
+    assert compacted.startswith("Jean Dupont\njean.dupont@example.com")
+    assert estimate_tokens(compacted) > 800
+
+def test_short_resume_is_only_normalized():
+    resume = "Jean Dupont\n\nEXPÉRIENCE\n• Python   / FastAPI\n"
+    assert compact_resume(resume, "python") == normalize(resume)
+
+def test_truncate_cuts_inside_a_line():
+    text = _long_line(2000)
+    cut = truncate_tokens(text, 100)
+    assert cut and text.startswith(cut)
+    assert estimate_tokens(cut) <= 100
+
+def test_truncate_giant_word():
+    assert truncate_tokens("x" * 50_000, 100)
+
+def test_page_footer_dropped_but_repeated_bullet_kept():
+    pages = ["Jean Dupont\n- Python\nCV - page", "Poste 2\n- Python\nCV - page"]
+    text = "\n".join(pages)
+    out = normalize(text, [0, len(pages[0]) + 1])
+    assert out.count("CV - page") == 1
+    assert out.count("- Python") == 2
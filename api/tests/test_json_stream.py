@@ -0,0 +1,55 @@
+"""Parseur incrémental des clés de premier niveau (llm.JsonFieldStream)."""
+import json
+
+from app.llm import JsonFieldStream
+
+ANSWER = {
+    "score": 72,
+    "forces": ["Python / FastAPI", "Docker, \"Kubernetes\" et {Helm}"],
+    "manques": [],
+    "reco": "Ajouter : AWS, Terraform.\nPuis une certification \\ cloud.",
+    "details": {"niveau": "senior", "ans": [3, 5], "note": "a, b} c"},
+    "ok": True,
+    "vide": None,
+}
+
+def _feed(parser: JsonFieldStream, text: str, step: int) -> list:
+    out = []
+    for i in range(0, len(text), step):
+        out.extend(parser.feed(text[i:i + step]))
+    return out
+
+
+def test_fields_in_order_whatever_the_chunking():
+    text = json.dumps(ANSWER, ensure_ascii=False)
+    for step in (1, 2, 7, len(text)):
+        assert _feed(JsonFieldStream(), text, step) == list(ANSWER.items())
+
+def test_escapes_and_unicode_escapes():
+    text = json.dumps({"reco": "guillemet \" antislash \\ fin", "nom": "Zoé"})  # ensure_ascii : é
+    assert dict(_feed(JsonFieldStream(), text, 3)) == {"reco": "guillemet \" antislash \\ fin", "nom": "Zoé"}
+
+def test_nested_values_are_emitted_whole():
+    text = '{"a": {"b": {"c": [1, {"d": "}"}]}}, "e": [[], [1, [2]]]}'
+    assert _feed(JsonFieldStream(), text, 1) == [("a", {"b": {"c": [1, {"d": "}"}]}}), ("e", [[], [1, [2]]])]
+
+def test_prose_and_fence_before_the_object():
+    text = 'Voici l\'analyse demandée, en "JSON" :\n```json\n{"score": 40, "reco": "ok"}\n```\nBonne chance !'
+    parser = JsonFieldStream()
+    assert _feed(parser, text, 5) == [("score", 40), ("reco", "ok")]
+    assert parser.done
+
+def test_field_emitted_as_soon_as_complete():
+    parser = JsonFieldStream()
+    assert parser.feed('{"score": 8') == []
+    assert parser.feed('1, "reco": "a') == [("score", 81)]
+    assert parser.feed('b"}') == [("reco", "ab")]
+
+def test_invalid_value_is_skipped_not_fatal():
+    text = '{"score": 7x, "reco": "ok"}'
+    assert _feed(JsonFieldStream(), text, 4) == [("reco", "ok")]
+
+def test_text_after_the_object_is_ignored():
+    parser = JsonFieldStream()
+    assert parser.feed('{"a": 1}{"b": 2}') == [("a", 1)]
+    assert parser.feed(', "c": 3}') == []
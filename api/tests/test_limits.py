@@ -0,0 +1,81 @@
+"""Token buckets de app/limits.py : table de slots (sonde, éviction, slots globaux réservés), coût > 1."""
+import pytest
+
+from app.limits import _PROBES, _SLOT, LLM_BUDGET_ROUTE, RateLimiter, _find_slot
+
+
+@pytest.fixture(params=["memory", "mmap"])
+def limiter(request, tmp_path):
+    path = str(tmp_path / "rl.bin") if request.param == "mmap" else ""
+    return RateLimiter(path=path, slots=64)
+
+
+# ---------- Table de slots ----------
+def _table(first: int, slots: int) -> bytearray:
+    return bytearray(slots * _SLOT.size)
+
+def test_probe_finds_key_after_collisions():
+    first, slots = 4, 4 + 16
+    buf = _table(first, slots)
+    keys = [5 + 16 * n for n in range(3)]  # même slot de départ
+    for n, key in enumerate(keys):
+        off, found = _find_slot(buf, first, slots, key)
+        assert not found
+        assert off == (first + 5 + n) * _SLOT.size  # sonde linéaire
+        _SLOT.pack_into(buf, off, key, 1.0, 100.0 + n)
+    assert _find_slot(buf, first, slots, keys[2]) == ((first + 7) * _SLOT.size, True)
+
+def test_probe_wraps_inside_the_table_only():
+    first, slots = 4, 4 + 16
+    buf = _table(first, slots)
+    key = 15  # dernier slot de la table : la sonde suivante revient au début de la table
+    _SLOT.pack_into(buf, (first + 15) * _SLOT.size, 99, 1.0, 1.0)
+    off, found = _find_slot(buf, first, slots, key)
+    assert not found and off == first * _SLOT.size  # jamais dans les slots réservés
+
+def test_full_probe_window_evicts_oldest():
+    first, slots = 4, 4 + 64
+    buf = _table(first, slots)
+    for p in range(_PROBES):
+        _SLOT.pack_into(buf, (first + p) * _SLOT.size, 1000 + p, 1.0, 50.0 if p == 3 else 100.0 + p)
+    off, found = _find_slot(buf, first, slots, 64 * 7)  # départ en 0, fenêtre pleine
+    assert not found and off == (first + 3) * _SLOT.size
+
+
+# ---------- Buckets ----------
+def test_client_burst_then_wait(limiter):
+    burst = limiter.burst(LLM_BUDGET_ROUTE)
+    for _ in range(int(burst)):
+        assert limiter.check(LLM_BUDGET_ROUTE, "10.0.0.1") == 0.0
+    assert limiter.check(LLM_BUDGET_ROUTE, "10.0.0.1") > 0
+    assert limiter.check(LLM_BUDGET_ROUTE, "10.0.0.2") == 0.0  # autre client, autre bucket
+
+def test_cost_is_all_or_nothing(limiter):
+    burst = int(limiter.burst(LLM_BUDGET_ROUTE))
+    assert limiter.check(LLM_BUDGET_ROUTE, "c", cost=burst - 2) == 0.0
+    assert limiter.available(LLM_BUDGET_ROUTE, "c") == pytest.approx(2, abs=0.01)
+    assert limiter.check(LLM_BUDGET_ROUTE, "c", cost=5) > 0  # refusé : rien n'est débité
+    assert limiter.check(LLM_BUDGET_ROUTE, "c", cost=2) == 0.0
+    assert limiter.check(LLM_BUDGET_ROUTE, "c", cost=burst + 1) > 0
+
+def test_stream_route_shares_the_llm_budget(limiter):
+    burst = int(limiter.burst(LLM_BUDGET_ROUTE))
+    assert limiter.check(LLM_BUDGET_ROUTE, "c", cost=burst) == 0.0
+    assert limiter.check("/analyze-text/stream", "c") > 0
+
+def test_global_bucket_survives_client_churn(limiter):
+    route = "/analyze-batch"
+    policy = limiter.policies[route]
+    accepted = sum(limiter.check(route, f"10.1.{i // 256}.{i % 256}") == 0.0 for i in range(5000))
+    assert accepted == pytest.approx(policy.global_burst, abs=2)  # 5000 clients, table de 64 slots
+    with limiter.store as buf:
+        assert _SLOT.unpack_from(buf, policy.global_slot)[0] == policy.global_key
+
+def test_global_slots_are_distinct_and_reserved(limiter):
+    slots = {p.global_slot for p in limiter.policies.values()}
+    assert len(slots) == len(limiter.policies)
+    assert max(slots) < limiter.reserved * _SLOT.size
+
+def test_table_too_small_is_rejected():
+    with pytest.raises(ValueError):
+        RateLimiter(path="", slots=_PROBES)
@@ -0,0 +1,315 @@
+"""
+Disjoncteur, AIMD, hedge, budget et basculement de app/upstream.py, contre le faux
+fournisseur de bench/fake_upstream.py servi en local (aucun réseau, aucun token).
+
+    cd api && python -m pytest -q tests
+"""
+import time, socket, asyncio, threading
+from contextlib import contextmanager
+
+import pytest
+import uvicorn
+
+from app import llm, upstream as upstream_mod
+from app.cache import ResultCache
+from app.upstream import AimdLimiter, Backend, Upstream, UpstreamError, UpstreamUnavailable
+from bench.fake_upstream import FakeUpstream
+
+
+# ---------- Outils ----------
+@contextmanager
+def serve(fake: FakeUpstream):
+    """Sert le faux fournisseur dans un thread ; renvoie son URL de base."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(fake.app(), host="127.0.0.1", port=port,
+                                           log_level="warning", timeout_graceful_shutdown=1))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}/openai/v1"
+    finally:
+        server.should_exit = True
+        thread.join(5)
+
+def backend(url: str, model: str = "fake-model", provider: str = "groq") -> Backend:
+    return Backend(provider, model, url, "fake")
+
+_opened: list[Backend] = []
+
+def run(coro_fn):
+    """Exécute puis ferme les clients httpx dans la même boucle."""
+    async def main():
+        try:
+            return await coro_fn()
+        finally:
+            for b in _opened:
+                await b.aclose()
+            _opened.clear()
+    return asyncio.run(main())
+
+def use(*backends: Backend, **kwargs) -> Upstream:
+    _opened.extend(backends)
+    return Upstream(list(backends), **kwargs)
+
+PAYLOAD = {"temperature": 0, "messages": [{"role": "user", "content": "ping"}]}
+
+
+class _Alternating(FakeUpstream):
+    """Requêtes impaires lentes, paires rapides : l'original traîne, la copie hedgée répond."""
+
+    def _delay(self) -> float:
+        return (self.slow_ms if self.stats["requests"] % 2 else self.latency_ms) / 1000
+
+
+# ---------- Disjoncteur ----------
+def test_breaker_opens_then_fails_fast():
+    fake = FakeUpstream(latency_ms=5, jitter_ms=0, error_rate=1.0, error_status=503)
+    with serve(fake) as url:
+        b = backend(url)
+        b.breaker.threshold = 3
+        up = use(b, retries=5, deadline=10)
+
+        async def scenario():
+            with pytest.raises(UpstreamUnavailable):
+                await up.complete(PAYLOAD)
+            assert b.breaker.state == "open"
+            assert fake.stats["requests"] == 3
+
+            start = time.monotonic()
+            with pytest.raises(UpstreamUnavailable) as exc:
+                await up.complete(PAYLOAD)
+            assert time.monotonic() - start < 0.1
+            assert exc.value.retry_after >= 1.0
+            assert fake.stats["requests"] == 3  # rejet local, aucun appel
+
+        run(scenario)
+
+def test_breaker_half_open_probe_closes_on_success():
+    fake = FakeUpstream(latency_ms=5, jitter_ms=0)
+    with serve(fake) as url:
+        b = backend(url)
+        b.breaker.cooldown = 0.05
+        for _ in range(b.breaker.threshold):
+            b.breaker.failure()
+        assert b.breaker.state == "open"
+        time.sleep(0.06)
+        up = use(b, retries=0, deadline=5)
+
+        data, served = run(lambda: up.complete(PAYLOAD))
+        assert served is b and data["model"] == b.model
+        assert b.breaker.state == "closed"
+
+
+# ---------- Concurrence adaptative ----------
+def test_aimd_decrease_on_drop_increase_on_ok():
+    async def scenario():
+        limiter = AimdLimiter("test", initial=4, maximum=8)
+        for _ in range(4):
+            await limiter.acquire(0.1)
+        assert not limiter.has_capacity()
+        with pytest.raises(UpstreamUnavailable):
+            await limiter.acquire(0.05)
+
+        limiter.release("drop")
+        assert limiter.limit == 2.0
+        limiter.release("drop")  # moins d'une seconde après : une seule réduction
+        assert limiter.limit == 2.0
+
+        limiter.release("ok")
+        limiter.release("ok")
+        assert limiter.in_flight == 0
+        assert 2.0 < limiter.limit < 3.0
+
+        for _ in range(200):
+            await limiter.acquire(0.1)
+            limiter.release("ok")
+        assert limiter.limit == 8.0  # plafond
+
+    asyncio.run(scenario())
+
+def test_aimd_waiter_gets_released_slot():
+    async def scenario():
+        limiter = AimdLimiter("test", initial=1, maximum=4)
+        await limiter.acquire(0.1)
+        waiter = asyncio.create_task(limiter.acquire(1.0))
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        limiter.release("ignore")
+        await waiter
+        assert limiter.in_flight == 1
+
+    asyncio.run(scenario())
+
+def test_overloaded_backend_is_rejected_within_budget():
+    fake = FakeUpstream(latency_ms=500, jitter_ms=0)
+    with serve(fake) as url:
+        b = backend(url)
+        b.limiter = AimdLimiter(b.name, initial=1, maximum=1)
+        up = use(b, retries=0, deadline=0.2)
+
+        async def scenario():
+            first = asyncio.create_task(up.complete(PAYLOAD))
+            await asyncio.sleep(0.05)
+            with pytest.raises(UpstreamUnavailable):
+                await up.complete(PAYLOAD)
+            with pytest.raises(UpstreamUnavailable):
+                await first  # 500 ms > budget de 200 ms
+            assert b.breaker.state == "closed"
+
+        run(scenario)
+
+
+# ---------- Hedge ----------
+def test_hedge_cuts_tail_latency(monkeypatch):
+    monkeypatch.setattr(upstream_mod, "LLM_HEDGE", True)
+    monkeypatch.setattr(upstream_mod, "LLM_HEDGE_MIN_DELAY", 0.05)
+    fake = _Alternating(latency_ms=10, jitter_ms=0, slow_ms=2000)
+    with serve(fake) as url:
+        b = backend(url)
+        for _ in range(b.latency.min_samples):
+            b.latency.add(0.01)  # p95 connu : hedge après le plancher de 50 ms
+        up = use(b, retries=0, deadline=5)
+
+        async def scenario():
+            durations = []
+            for _ in range(5):
+                start = time.monotonic()
+                data, served = await up.complete(PAYLOAD)
+                durations.append(time.monotonic() - start)
+                assert served is b and data["choices"]
+            return durations
+
+        durations = run(scenario)
+        assert max(durations) < 0.5
+        assert fake.stats["requests"] == 10  # une copie par requête
+        assert b.limiter.in_flight == 0       # perdants annulés, places rendues
+
+def test_no_hedge_when_disabled(monkeypatch):
+    monkeypatch.setattr(upstream_mod, "LLM_HEDGE", False)
+    fake = _Alternating(latency_ms=10, jitter_ms=0, slow_ms=300)
+    with serve(fake) as url:
+        b = backend(url)
+        for _ in range(b.latency.min_samples):
+            b.latency.add(0.01)
+        up = use(b, retries=0, deadline=5)
+
+        start = time.monotonic()
+        run(lambda: up.complete(PAYLOAD))
+        assert time.monotonic() - start >= 0.3
+        assert fake.stats["requests"] == 1
+
+def test_streams_do_not_feed_hedge_window():
+    fake = FakeUpstream(latency_ms=5, jitter_ms=0, chunks=2, token_ms=1)
+    with serve(fake) as url:
+        b = backend(url)
+        up = use(b, retries=0, deadline=5)
+
+        async def scenario():
+            for _ in range(b.latency.min_samples):
+                async for _ in up.stream({**PAYLOAD, "stream": True}):
+                    pass
+
+        run(scenario)
+        assert len(b.ttft.samples) == b.latency.min_samples
+        assert not b.latency.samples and b.hedge_delay() is None
+
+
+# ---------- Budget ----------
+def test_deadline_bounds_complete():
+    fake = FakeUpstream(latency_ms=3000, jitter_ms=0)
+    with serve(fake) as url:
+        up = use(backend(url), retries=3, deadline=0.5)
+
+        start = time.monotonic()
+        with pytest.raises(UpstreamUnavailable):
+            run(lambda: up.complete(PAYLOAD))
+        assert time.monotonic() - start < 1.5
+
+def test_deadline_bounds_first_token():
+    fake = FakeUpstream(latency_ms=3000, jitter_ms=0)
+    with serve(fake) as url:
+        up = use(backend(url), retries=3, deadline=0.5)
+
+        async def scenario():
+            async for _ in up.stream({**PAYLOAD, "stream": True}):
+                pass
+
+        start = time.monotonic()
+        with pytest.raises(UpstreamUnavailable):
+            run(scenario)
+        assert time.monotonic() - start < 1.5
+
+def test_stream_yields_deltas():
+    fake = FakeUpstream(latency_ms=5, jitter_ms=0, chunks=4, token_ms=1)
+    with serve(fake) as url:
+        b = backend(url)
+        up = use(b, retries=0, deadline=5)
+
+        async def scenario():
+            return [(delta, served) async for delta, served in up.stream({**PAYLOAD, "stream": True})]
+
+        out = run(scenario)
+        assert len(out) == 4 and all(served is b for _, served in out)
+        assert b.limiter.in_flight == 0 and b.breaker.state == "closed"
+
+
+# ---------- Basculement ----------
+def test_failover_to_secondary_backend():
+    down = FakeUpstream(latency_ms=5, jitter_ms=0, error_rate=1.0, error_status=503)
+    up_ = FakeUpstream(latency_ms=5, jitter_ms=0)
+    with serve(down) as url_a, serve(up_) as url_b:
+        a, b = backend(url_a, "primary"), backend(url_b, "secondary", provider="openai")
+        up = use(a, b, retries=2, deadline=5)
+
+        start = time.monotonic()
+        data, served = run(lambda: up.complete(PAYLOAD))
+        assert served is b and data["model"] == "secondary"
+        assert time.monotonic() - start < 0.4  # pas de backoff en changeant de backend
+        assert down.stats["requests"] == 1 and up_.stats["requests"] == 1
+
+def test_non_retryable_error_is_raised_with_single_backend():
+    fake = FakeUpstream(latency_ms=5, jitter_ms=0, error_rate=1.0, error_status=400)
+    with serve(fake) as url:
+        b = backend(url)
+        up = use(b, retries=2, deadline=5)
+
+        with pytest.raises(UpstreamError) as exc:
+            run(lambda: up.complete(PAYLOAD))
+        assert not exc.value.retryable
+        assert fake.stats["requests"] == 1
+        assert b.breaker.state == "closed"
+
+def test_failover_result_is_not_cached(monkeypatch):
+    down = FakeUpstream(latency_ms=5, jitter_ms=0, error_rate=1.0, error_status=503)
+    up_ = FakeUpstream(latency_ms=5, jitter_ms=0)
+    with serve(down) as url_a, serve(up_) as url_b:
+        a = backend(url_a, llm.GROQ_MODEL)
+        b = backend(url_b, "secondary", provider="openai")
+        monkeypatch.setattr(llm, "upstream", use(a, b, retries=2, deadline=5))
+        monkeypatch.setattr(llm, "_analysis_cache", ResultCache("test", db_path=""))
+
+        async def scenario():
+            first = await llm.analyze_with_llm("cv python", "offre python")
+            second = await llm.analyze_with_llm("cv python", "offre python")
+            return first, second
+
+        first, second = run(scenario)
+        assert first["model"] == second["model"] == "secondary"
+        assert up_.stats["requests"] == 2  # servi par le secours : recalculé, pas relu du cache
+
+def test_primary_result_is_cached(monkeypatch):
+    fake = FakeUpstream(latency_ms=5, jitter_ms=0)
+    with serve(fake) as url:
+        monkeypatch.setattr(llm, "upstream", use(backend(url, llm.GROQ_MODEL), retries=0, deadline=5))
+        monkeypatch.setattr(llm, "_analysis_cache", ResultCache("test", db_path=""))
+
+        async def scenario():
+            return [await llm.analyze_with_llm("cv python", "offre python") for _ in range(2)]
+
+        first, second = run(scenario)
+        assert first["model"] == second["model"] == llm.GROQ_MODEL
+        assert fake.stats["requests"] == 1
@@ -6,6 +6,7 @@ const API_PUBLIC = process.env.NEXT_PUBLIC_API_BASE_URL || "";
 
 export default function Home() {
   const [resume, setResume] = useState("");
+  const [resumeDoc, setResumeDoc] = useState(null); // { id, text } du dernier CV importé
   const [job, setJob] = useState("");
   const [errorMsg, setErrorMsg] = useState("");
   const [ping, setPing] = useState(null);
@@ -39,23 +40,83 @@ export default function Home() {
         throw new Error(`upload failed: ${res.status} ${t}`);
       }
       const data = await res.json();
-      setResume((data.text || "").trim());
+      const text = (data.text || "").trim();
+      setResume(text);
+      setResumeDoc(data.resume_id ? { id: data.resume_id, text } : null);
     } catch (e) { notifyError(e); }
   }
 
+  // CV importé et non modifié : on envoie son id au lieu de renvoyer tout le texte
+  async function postWithResume(url, fields) {
+    const send = (ref) => fetch(url, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ ...ref, ...fields }),
+    });
+    if (!resumeDoc || resumeDoc.text !== resume) return send({ resume });
+    const res = await send({ resume_id: resumeDoc.id });
+    if (res.status !== 404) return res;
+    setResumeDoc(null); // expiré côté serveur
+    return send({ resume });
+  }
+
+  // 429 / 503 : on affiche le délai Retry-After plutôt que de relancer ailleurs
+  async function httpError(url, res) {
+    const t = await res.text();
+    const wait = res.headers.get("Retry-After");
+    return new Error(`${url} ${res.status}${wait ? ` (réessayer dans ${wait} s)` : ""} ${t}`);
+  }
+
+  // Repli sur /analyze-text seulement si le streaming n'est pas disponible : route absente,
+  // format refusé, ou 5xx sans Retry-After. Jamais sur 429 ni sur une saturation annoncée.
+  function streamUnsupported(res) {
+    if ([404, 405, 415, 501].includes(res.status)) return true;
+    return res.status >= 500 && !res.headers.get("Retry-After");
+  }
+
   async function doAnalyze() {
     setErrorMsg("");
     setAnalysis(null);
+    const fields = { job, language: "fr", gender: "auto" };
     try {
-      const res = await fetch("/api/analyze-text", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ resume, job, language: "fr", gender: "auto" }),
-      });
-      if (!res.ok) {
-        const t = await res.text();
-        throw new Error(`/api/analyze-text ${res.status} ${t}`);
+      // Streaming (SSE) : chaque clé s'affiche dès qu'elle est complète
+      let stream = null;
+      try {
+        stream = await postWithResume("/api/analyze-text/stream", fields);
+      } catch {
+        stream = null; // erreur réseau (proxy sans SSE, connexion coupée) : repli
+      }
+      if (stream && !stream.ok && !streamUnsupported(stream)) {
+        throw await httpError("/api/analyze-text/stream", stream);
+      }
+      if (stream && stream.ok && stream.body) {
+        const reader = stream.body.getReader();
+        const decoder = new TextDecoder();
+        let buf = "";
+        for (;;) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buf += decoder.decode(value, { stream: true });
+          let sep;
+          while ((sep = buf.indexOf("\n\n")) >= 0) {
+            const raw = buf.slice(0, sep);
+            buf = buf.slice(sep + 2);
+            const event = (raw.match(/^event: (.*)$/m) || [])[1];
+            const data = (raw.match(/^data: (.*)$/m) || [])[1];
+            if (!data) continue;
+            const msg = JSON.parse(data);
+            // Pré-score local : affiché tout de suite, remplacé par l'analyse LLM
+            if (event === "prescore") setAnalysis((a) => ({ score: msg.score, mots_cles: msg.matched, ...(a || {}) }));
+            else if (event === "field") setAnalysis((a) => ({ ...(a || {}), [msg.key]: msg.value }));
+            else if (event === "done") setAnalysis(msg);
+            else if (event === "error") throw new Error(msg.error || "analyse échouée");
+          }
+        }
+        return;
       }
+
+      const res = await postWithResume("/api/analyze-text", fields);
+      if (!res.ok) throw await httpError("/api/analyze-text", res);
       setAnalysis(await res.json());
     } catch (e) { notifyError(e); }
   }
@@ -63,11 +124,7 @@ export default function Home() {
   async function optimizeLinkedIn() {
     setErrorMsg("");
     try {
-      const res = await fetch("/api/linkedin/optimize", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ resume, job, language: "fr", gender: "auto" }),
-      });
+      const res = await postWithResume("/api/linkedin/optimize", { job, language: "fr", gender: "auto" });
       if (!res.ok) throw new Error(`/api/linkedin/optimize ${res.status}`);
       const data = await res.json();
       setLiHeadline(data?.headline || "");